@@ -0,0 +1 @@
+default_app_config = 'ad_manager.apps.ADManagerConfig'
@@ -16,6 +16,7 @@
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin import AdminSite
+from django.contrib.admin.actions import delete_selected
 from django.contrib.auth import get_permission_codename
 from django.contrib.auth.models import User, Group
 from django.core.urlresolvers import reverse
@@ -37,6 +38,9 @@ from ad_manager.models import (
     RouterWeb,
     SibraServerWeb,
 )
+from ad_manager.util.local_config_generator import (
+    remove_deleted_prometheus_targets,
+)
 
 
 class MyAdminSite(AdminSite):
@@ -93,6 +97,43 @@ class PrivilegedChangeAdmin(GuardedModelAdmin):
 class SortRelatedAdmin(PrivilegedChangeAdmin):
     privileged_fields = ('isd', 'is_core_ad',)
 
+    def delete_model(self, request, obj):
+        deleted = self._deleted_ases(self.model.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        remove_deleted_prometheus_targets(deleted)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if 'delete_selected' in actions:
+            _, name, description = actions['delete_selected']
+            actions['delete_selected'] = (type(self).delete_selected_ases,
+                                          name, description)
+        return actions
+
+    def delete_selected_ases(self, request, queryset):
+        """
+        The delete_selected action, which deletes the queryset without
+        calling delete_model().
+        """
+        deleted = self._deleted_ases(queryset)
+        response = delete_selected(self, request, queryset)
+        # No response once the deletion was confirmed and done
+        if response is None:
+            remove_deleted_prometheus_targets(deleted)
+        return response
+
+    def _deleted_ases(self, queryset):
+        """
+        Returns the (ISD, AS) id pairs of the ASes deleted with the queryset.
+        """
+        if self.model is AD:
+            ases = queryset
+        elif self.model is ISD:
+            ases = AD.objects.filter(isd__in=queryset)
+        else:
+            return []
+        return list(ases.values_list('isd_id', 'as_id'))
+
 
 @admin.register(BeaconServerWeb,
                 CertificateServerWeb,
@@ -0,0 +1,35 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# External packages
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# SCION-WEB
+from ad_manager.util.coord_events import run_events_poller
+
+
+class Command(BaseCommand):
+    help = ('Periodically polls the requests and replies of the ASes from '
+            'the SCION Coordination Service')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            default=settings.COORD_EVENTS_POLL_INTERVAL,
+                            help='Seconds between two polls')
+        parser.add_argument('--once', action='store_true',
+                            help='Poll once and exit')
+
+    def handle(self, *args, **options):
+        run_events_poller(options['interval'], options['once'])
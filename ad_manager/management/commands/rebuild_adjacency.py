@@ -0,0 +1,27 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# External packages
+from django.core.management.base import BaseCommand
+
+# SCION-WEB
+from ad_manager.util.adjacency import rebuild_adjacency
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the AS adjacency index from the stored routers'
+
+    def handle(self, *args, **options):
+        count = rebuild_adjacency()
+        self.stdout.write('AS adjacency index rebuilt: %s entries' % count)
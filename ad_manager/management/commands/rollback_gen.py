@@ -0,0 +1,40 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import os
+
+# External packages
+from django.core.management.base import BaseCommand, CommandError
+
+# SCION
+from lib.packet.scion_addr import ISD_AS
+
+# SCION-WEB
+from ad_manager.util.local_config_generator import WEB_ROOT, rollback_as_gen
+
+
+class Command(BaseCommand):
+    help = 'Publishes the previous generation of the gen folder of an AS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('isd_as', help='ISD-AS, e.g. 1-11')
+
+    def handle(self, *args, **options):
+        local_gen_path = os.path.join(WEB_ROOT, 'gen')
+        try:
+            path = rollback_as_gen(local_gen_path, ISD_AS(options['isd_as']))
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Published %s' % path)
@@ -0,0 +1,50 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import multiprocessing
+
+# External packages
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# SCION-WEB
+from ad_manager.util.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs (e.g. the generation of configs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.JOB_WORKERS,
+                            help='Number of worker processes')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is pending')
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            run_worker(once=options['once'])
+            return
+        # The worker processes must not share the database connection
+        for connection in connections.all():
+            connection.close()
+        workers = [multiprocessing.Process(target=run_worker,
+                                           kwargs={'once': options['once']})
+                   for _ in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
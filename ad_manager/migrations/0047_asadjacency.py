@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def build_adjacency(apps, schema_editor):
+    router_model = apps.get_model("ad_manager", "RouterWeb")
+    adjacency_model = apps.get_model("ad_manager", "ASAdjacency")
+    rows = set(router_model.objects.filter(
+        neighbor_isd_id__isnull=False, neighbor_as_id__isnull=False,
+    ).values_list('ad_id', 'neighbor_isd_id', 'neighbor_as_id'))
+    adjacency_model.objects.bulk_create(
+        adjacency_model(ad_id=ad_id, neighbor_isd_id=isd_id,
+                        neighbor_as_id=as_id)
+        for ad_id, isd_id, as_id in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0046_auto_20170406_0908'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ASAdjacency',
+            fields=[
+                ('id', models.AutoField(serialize=False, verbose_name='ID', auto_created=True, primary_key=True)),
+                ('neighbor_isd_id', models.IntegerField()),
+                ('neighbor_as_id', models.IntegerField()),
+                ('ad', models.ForeignKey(to='ad_manager.AD')),
+            ],
+            options={
+                'verbose_name': 'AS adjacency',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='asadjacency',
+            unique_together=set([('ad', 'neighbor_isd_id', 'neighbor_as_id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='asadjacency',
+            index_together=set([('neighbor_isd_id', 'neighbor_as_id')]),
+        ),
+        migrations.RunPython(build_adjacency, migrations.RunPython.noop),
+    ]
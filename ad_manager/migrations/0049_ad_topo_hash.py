@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def compute_hashes(apps, schema_editor):
+    model_obj = apps.get_model("ad_manager", "AD")
+    for ad in model_obj.objects.all():
+        flat_string = json.dumps(ad.original_topology, sort_keys=True)
+        ad.topo_hash = hashlib.md5(flat_string.encode('utf-8')).hexdigest()
+        ad.topology_version = 1
+        ad.save(update_fields=['topo_hash', 'topology_version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0048_networkgraphversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ad',
+            name='topo_hash',
+            field=models.CharField(max_length=32, blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='ad',
+            name='topology_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(compute_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0049_ad_topo_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='connectionrequest',
+            name='status',
+            field=models.CharField(max_length=20, choices=[('NONE', 'NONE'), ('SENT', 'SENT'), ('APPROVED', 'APPROVED'), ('DECLINED', 'DECLINED')], default='NONE', db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='joinrequest',
+            name='status',
+            field=models.CharField(max_length=20, choices=[('NONE', 'NONE'), ('SENT', 'SENT'), ('ACCEPTED', 'ACCEPTED'), ('DECLINED', 'DECLINED')], default='NONE', db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='routerweb',
+            index_together=set([('neighbor_isd_id', 'neighbor_as_id'), ('addr', 'interface_port')]),
+        ),
+    ]
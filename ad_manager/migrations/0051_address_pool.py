@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ipaddress import ip_address
+
+from django.db import migrations, models
+
+ELEMENT_MODELS = ['BeaconServerWeb', 'CertificateServerWeb', 'PathServerWeb',
+                  'SibraServerWeb']
+ROUTER_ADDR_FIELDS = ['addr', 'interface_addr', 'interface_toaddr']
+
+
+def seed_address_pool(apps, schema_editor):
+    max_ip = ip_address('127.0.0.1')
+    addrs = []
+    for model_name in ELEMENT_MODELS:
+        model = apps.get_model('ad_manager', model_name)
+        addrs += model.objects.values_list('addr', flat=True)
+    router_model = apps.get_model('ad_manager', 'RouterWeb')
+    for row in router_model.objects.values_list(*ROUTER_ADDR_FIELDS):
+        addrs += row
+    for addr in addrs:
+        try:
+            addr = ip_address(addr)
+        except ValueError:
+            continue
+        if addr > max_ip and str(addr).startswith('127.'):
+            max_ip = addr
+    pool_model = apps.get_model('ad_manager', 'AddressPool')
+    pool_model.objects.create(id=1, next_addr=str(max_ip + 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0050_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressAllocation',
+            fields=[
+                ('id', models.AutoField(serialize=False, verbose_name='ID', auto_created=True, primary_key=True)),
+                ('addr', models.GenericIPAddressField(unique=True)),
+                ('isd_id', models.IntegerField(null=True, blank=True)),
+                ('as_id', models.IntegerField(null=True, blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AddressPool',
+            fields=[
+                ('id', models.AutoField(serialize=False, verbose_name='ID', auto_created=True, primary_key=True)),
+                ('next_addr', models.GenericIPAddressField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='addressallocation',
+            index_together=set([('isd_id', 'as_id')]),
+        ),
+        migrations.RunPython(seed_address_pool, migrations.RunPython.noop),
+    ]
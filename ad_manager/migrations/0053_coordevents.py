@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import ad_manager.util.common
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0052_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoordEvents',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('join_requests', jsonfield.fields.JSONField(default=ad_manager.util.common.empty_list)),
+                ('conn_requests', jsonfield.fields.JSONField(default=ad_manager.util.common.empty_list)),
+                ('conn_replies', jsonfield.fields.JSONField(default=ad_manager.util.common.empty_list)),
+                ('polled', models.DateTimeField(null=True, blank=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('account', models.ForeignKey(to='ad_manager.OrganisationAdmin')),
+                ('ad', models.ForeignKey(to='ad_manager.AD')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='coordevents',
+            unique_together=set([('account', 'ad')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ad_manager', '0053_coordevents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='claim_token',
+            field=models.CharField(max_length=32, blank=True, default=''),
+        ),
+    ]
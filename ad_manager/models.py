@@ -15,12 +15,14 @@
 # Stdlib
 import copy
 import logging
+from collections import OrderedDict
 
 # External packages
 import jsonfield
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.db import models, IntegrityError
+from django.db import connection, models, transaction, IntegrityError
+from django.utils import timezone
 
 # SCION
 from lib.defines import (
@@ -33,7 +35,8 @@ from lib.defines import (
 from lib.packet.scion_addr import ISD_AS
 
 # SCION-WEB
-from ad_manager.util.common import empty_dict
+from ad_manager.signals import topology_update
+from ad_manager.util.common import empty_dict, empty_list, topology_hash
 from ad_manager.util.defines import (
     DEFAULT_BANDWIDTH,
     SCION_SUGGESTED_PORT,
@@ -58,6 +61,27 @@ class SelectRelatedModelManager(models.Manager):
             return queryset.select_related(*related_fields)
 
 
+class ADQuerySet(models.QuerySet):
+    """
+    QuerySet for ASes with helpers for loading the infrastructure elements.
+    """
+
+    def with_elements(self):
+        """
+        Prefetch all infrastructure element sets of the selected ASes, so
+        generate_topology_dict() and get_all_elements() do not issue any
+        additional queries per AS.
+        """
+        return self.prefetch_related(*AD.ELEMENT_SETS.values())
+
+    def light(self):
+        """
+        Defer the heavy columns (topology, certificate, TRC and keys), which
+        are not needed for listing the ASes. They are loaded on access.
+        """
+        return self.defer(*AD.HEAVY_FIELDS)
+
+
 class OrganisationAdmin(models.Model):
     user = models.OneToOneField(User)
     is_org_admin = models.BooleanField(default=False)
@@ -94,15 +118,59 @@ class AD(models.Model):
     master_as_key = models.CharField(max_length=100, null=True, blank=True)
     certificate = models.TextField(null=True, blank=True)
     trc = models.TextField(null=True, blank=True)
+    # Maintained on save, see AD.save()
+    topo_hash = models.CharField(max_length=32, blank=True, default='')
+    topology_version = models.IntegerField(default=0)
+
+    # Columns deferred by AD.objects.light()
+    HEAVY_FIELDS = ('original_topology', 'certificate', 'trc',
+                    'sig_pub_key', 'sig_priv_key', 'enc_pub_key',
+                    'enc_priv_key', 'master_as_key')
+
+    # Topology keys and the related sets holding the corresponding elements
+    ELEMENT_SETS = OrderedDict([
+        ('BorderRouters', 'routerweb_set'),
+        ('PathServers', 'pathserverweb_set'),
+        ('BeaconServers', 'beaconserverweb_set'),
+        ('CertificateServers', 'certificateserverweb_set'),
+        ('SibraServers', 'sibraserverweb_set'),
+    ])
 
     # Use custom model manager with select_related()
-    objects = SelectRelatedModelManager()
+    objects = SelectRelatedModelManager.from_queryset(ADQuerySet)()
 
     class Meta:
         unique_together = (("as_id", "isd"),)
         verbose_name = 'AD'
         ordering = ['as_id']
 
+    def save(self, *args, **kwargs):
+        """
+        Update the stored topology hash and bump the topology version if
+        the original topology changed.
+        """
+        update_fields = kwargs.get('update_fields')
+        topology_loaded = ('original_topology' not in
+                           self.get_deferred_fields())
+        if topology_loaded and (update_fields is None or
+                                'original_topology' in update_fields):
+            new_hash = topology_hash(self.original_topology)
+            if new_hash != self.topo_hash:
+                self.topo_hash = new_hash
+                self.topology_version += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = list(update_fields) + [
+                        'topo_hash', 'topology_version']
+        super(AD, self).save(*args, **kwargs)
+
+    def _element_groups(self):
+        """
+        Yield (topology key, elements) pairs. The elements are taken from the
+        prefetch cache if the AS was loaded with AD.objects.with_elements().
+        """
+        for key, related_name in self.ELEMENT_SETS.items():
+            yield key, getattr(self, related_name).all()
+
     def generate_topology_dict(self):
         """
         Create a Python dictionary with the stored AS topology.
@@ -112,28 +180,13 @@ class AD(models.Model):
         out_dict.update({
             'ISDID': int(self.isd_id), 'ADID': int(self.as_id),
             'Core': int(self.is_core_ad),
-            'BorderRouters': {}, 'PathServers': {}, 'BeaconServers': {},
-            'CertificateServers': {}, 'SibraServers': {},
         })
-        for router in self.routerweb_set.all():
-            out_dict['BorderRouters'][str(router.name)] = router.get_dict()
-        for ps in self.pathserverweb_set.all():
-            out_dict['PathServers'][str(ps.name)] = ps.get_dict()
-        for bs in self.beaconserverweb_set.all():
-            out_dict['BeaconServers'][str(bs.name)] = bs.get_dict()
-        for cs in self.certificateserverweb_set.all():
-            out_dict['CertificateServers'][str(cs.name)] = cs.get_dict()
-        for sb in self.sibraserverweb_set.all():
-            out_dict['SibraServers'][str(sb.name)] = sb.get_dict()
+        for key, elements in self._element_groups():
+            out_dict[key] = {str(el.name): el.get_dict() for el in elements}
         return out_dict
 
     def get_all_elements(self):
-        elements = [self.routerweb_set.all(),
-                    self.pathserverweb_set.all(),
-                    self.beaconserverweb_set.all(),
-                    self.certificateserverweb_set.all(),
-                    self.sibraserverweb_set.all()]
-        for element_group in elements:
+        for _, element_group in self._element_groups():
             for element in element_group:
                 yield element
 
@@ -142,13 +195,30 @@ class AD(models.Model):
         element_ids = [element.id_str() for element in all_elements]
         return element_ids
 
-    def fill_from_topology(self, topology_dict, clear=False, auto_refs=False):
+    def fill_from_topology(self, topology_dict, clear=False, auto_refs=False,
+                           bulk=False):
         """
         Add infrastructure elements (servers, routers) to the AD, extracted
         from the topology dictionary.
+
+        If 'bulk' is set, the topology is diffed against the stored elements
+        and the changes are applied with a constant number of set-based
+        queries per element type, inside a single transaction.
         """
         assert isinstance(topology_dict, dict), 'Dictionary expected'
 
+        if bulk:
+            with transaction.atomic(), topology_update(self):
+                self._fill_from_topology_bulk(topology_dict, clear)
+            return
+
+        with topology_update(self):
+            self._fill_from_topology(topology_dict, clear)
+
+    def _fill_from_topology(self, topology_dict, clear):
+        """
+        Per-element counterpart of _fill_from_topology_bulk().
+        """
         if clear:
             self.routerweb_set.all().delete()
             self.pathserverweb_set.all().delete()
@@ -160,72 +230,48 @@ class AD(models.Model):
         self.is_core_ad = (topology_dict['Core'] == 1)
         self.save()
 
-        routers = topology_dict["BorderRouters"]
-        beacon_servers = topology_dict["BeaconServers"]
-        certificate_servers = topology_dict["CertificateServers"]
-        path_servers = topology_dict["PathServers"]
-        sibra_servers = topology_dict["SibraServers"]
-
         try:
-            for name, router in routers.items():
-                interface = router["Interface"]
-                isd_id, as_id = ISD_AS(interface["ISD_AS"])
-                RouterWeb.objects.update_or_create(
-                    addr=router["Addr"], ad=self,
-                    port=router["Port"],
-                    addr_internal='',
-                    port_internal=None,
-                    name=name,
-                    neighbor_isd_id=isd_id,
-                    neighbor_as_id=as_id,
-                    neighbor_type=interface["LinkType"],
-                    interface_addr=interface["Addr"],
-                    interface_toaddr=interface["ToAddr"],
-                    interface_id=interface["IFID"],
-                    interface_port=interface["UdpPort"],
-                    interface_toport=interface["ToUdpPort"],
-                )
-
-            for name, bs in beacon_servers.items():
-                BeaconServerWeb.objects.\
-                    update_or_create(addr=bs["Addr"],
-                                     port=bs["Port"],
-                                     addr_internal=bs["AddrInternal"],
-                                     port_internal=bs["PortInternal"],
-                                     name=name,
-                                     ad=self)
-
-            for name, cs in certificate_servers.items():
-                CertificateServerWeb.objects.\
-                    update_or_create(addr=cs["Addr"],
-                                     port=cs["Port"],
-                                     addr_internal=cs["AddrInternal"],
-                                     port_internal=cs["PortInternal"],
-                                     name=name,
-                                     ad=self)
-
-            for name, ps in path_servers.items():
-                PathServerWeb.objects.\
-                    update_or_create(addr=ps["Addr"],
-                                     port=ps["Port"],
-                                     addr_internal=ps["AddrInternal"],
-                                     port_internal=ps["PortInternal"],
-                                     name=name,
-                                     ad=self)
-
-            for name, sb in sibra_servers.items():
-                SibraServerWeb.objects.\
-                    update_or_create(addr=sb["Addr"],
-                                     port=sb["Port"],
-                                     addr_internal=sb["AddrInternal"],
-                                     port_internal=sb["PortInternal"],
-                                     name=name,
-                                     ad=self)
+            for model, elements, get_fields in \
+                    _topology_element_groups(topology_dict):
+                for name, element in elements.items():
+                    model.objects.update_or_create(ad=self, name=name,
+                                                   **get_fields(element))
         except IntegrityError:
             logging.warning("Integrity error in AD.fill_from_topology(): "
                             "ignoring")
             raise
 
+    def _fill_from_topology_bulk(self, topology_dict, clear):
+        """
+        Bulk counterpart of fill_from_topology(). Elements are matched by
+        name: unchanged rows are left alone, changed rows are deleted and
+        re-inserted together with the new ones, and rows missing from the
+        topology are deleted if 'clear' is set.
+        """
+        self.original_topology = topology_dict
+        self.is_core_ad = (topology_dict['Core'] == 1)
+        self.save()
+
+        for model, elements, get_fields in \
+                _topology_element_groups(topology_dict):
+            existing = {el.name: el for el in model.objects.filter(ad=self)}
+            to_delete = []
+            to_create = []
+            for name, element in elements.items():
+                fields = get_fields(element)
+                current = existing.pop(str(name), None)
+                if current is not None:
+                    if not _element_differs(current, fields):
+                        continue
+                    to_delete.append(current.id)
+                to_create.append(model(ad=self, name=name, **fields))
+            if clear:
+                to_delete.extend(el.id for el in existing.values())
+            if to_delete:
+                model.objects.filter(id__in=to_delete).delete()
+            if to_create:
+                model.objects.bulk_create(to_create)
+
     def get_absolute_url(self):
         return reverse('ad_detail', args=[self.as_id])
 
@@ -325,6 +371,8 @@ class RouterWeb(SCIONWebElement):
     class Meta:
         verbose_name = 'Router'
         unique_together = (("ad", "addr", "port"),)
+        index_together = (("neighbor_isd_id", "neighbor_as_id"),
+                          ("addr", "interface_port"))
 
 
 class SibraServerWeb(SCIONWebElement):
@@ -335,6 +383,116 @@ class SibraServerWeb(SCIONWebElement):
         unique_together = (("ad", "addr", "port"),)
 
 
+def _router_fields(router):
+    """
+    Extract the RouterWeb field values from a topology router entry.
+    """
+    interface = router["Interface"]
+    isd_id, as_id = ISD_AS(interface["ISD_AS"])
+    return {
+        'addr': router["Addr"],
+        'port': router["Port"],
+        'addr_internal': '',
+        'port_internal': None,
+        'neighbor_isd_id': isd_id,
+        'neighbor_as_id': as_id,
+        'neighbor_type': interface["LinkType"],
+        'interface_addr': interface["Addr"],
+        'interface_toaddr': interface["ToAddr"],
+        'interface_id': interface["IFID"],
+        'interface_port': interface["UdpPort"],
+        'interface_toport': interface["ToUdpPort"],
+    }
+
+
+def _server_fields(server):
+    """
+    Extract the server field values from a topology server entry.
+    """
+    return {
+        'addr': server["Addr"],
+        'port': server["Port"],
+        'addr_internal': server["AddrInternal"],
+        'port_internal': server["PortInternal"],
+    }
+
+
+def _topology_element_groups(topology_dict):
+    """
+    Return (model, elements, field extractor) triples for every element
+    type stored in a topology dictionary.
+    """
+    return [
+        (RouterWeb, topology_dict["BorderRouters"], _router_fields),
+        (BeaconServerWeb, topology_dict["BeaconServers"], _server_fields),
+        (CertificateServerWeb, topology_dict["CertificateServers"],
+         _server_fields),
+        (PathServerWeb, topology_dict["PathServers"], _server_fields),
+        (SibraServerWeb, topology_dict["SibraServers"], _server_fields),
+    ]
+
+
+def _element_differs(element, fields):
+    """
+    Check whether the stored element differs from the given field values,
+    comparing the values the way they would be written to the database.
+    """
+    for field_name, value in fields.items():
+        field = element._meta.get_field(field_name)
+        current = getattr(element, field_name)
+        if (field.get_db_prep_save(current, connection) !=
+                field.get_db_prep_save(value, connection)):
+            return True
+    return False
+
+
+class ASAdjacency(models.Model):
+    """
+    Materialized AS adjacency: one row per AS and neighbor ISD-AS referenced
+    by at least one of its routers. Kept up to date from the routers by
+    ad_manager.util.adjacency.
+    """
+    ad = models.ForeignKey(AD)
+    neighbor_isd_id = models.IntegerField()
+    neighbor_as_id = models.IntegerField()
+
+    class Meta:
+        verbose_name = 'AS adjacency'
+        unique_together = (("ad", "neighbor_isd_id", "neighbor_as_id"),)
+        index_together = (("neighbor_isd_id", "neighbor_as_id"),)
+
+
+class NetworkGraphVersion(models.Model):
+    """
+    Single row versioning the AS graph (ASes and their adjacency), used for
+    HTTP caching of the network graph API.
+    """
+    version = models.IntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+
+class AddressPool(models.Model):
+    """
+    Single row holding the next never allocated private address, i.e. the
+    high-water mark of ad_manager.util.address_pool.
+    """
+    next_addr = models.GenericIPAddressField()
+
+
+class AddressAllocation(models.Model):
+    """
+    Private address handed out by ad_manager.util.address_pool. The owner
+    ISD-AS is cleared when the address is released, which puts the row on
+    the free list.
+    """
+    addr = models.GenericIPAddressField(unique=True)
+    isd_id = models.IntegerField(null=True, blank=True)
+    as_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        index_together = (("isd_id", "as_id"),)
+
+
 class JoinRequest(models.Model):
     STATUS_OPTIONS = ['NONE', 'SENT', 'ACCEPTED', 'DECLINED']
     created_by = models.ForeignKey(User)
@@ -343,7 +501,7 @@ class JoinRequest(models.Model):
     join_as_a_core = models.BooleanField(default=False)
     status = models.CharField(max_length=20,
                               choices=zip(STATUS_OPTIONS, STATUS_OPTIONS),
-                              default='NONE')
+                              default='NONE', db_index=True)
 
     sig_pub_key = models.CharField(max_length=100, null=True, blank=True)
     sig_priv_key = models.CharField(max_length=100, null=True, blank=True)
@@ -381,10 +539,64 @@ class ConnectionRequest(models.Model):
                                     default='UDP/IPv4')
     status = models.CharField(max_length=20,
                               choices=zip(STATUS_OPTIONS, STATUS_OPTIONS),
-                              default='NONE')
+                              default='NONE', db_index=True)
 
     related_fields = ('connect_from__isd', 'created_by')
     objects = SelectRelatedModelManager()
 
     def is_approved(self):
         return self.status == 'APPROVED'
+
+
+class Job(models.Model):
+    """
+    Unit of work run outside of the request by a job worker, see
+    ad_manager.util.jobs.
+    """
+    STATUS_OPTIONS = ['PENDING', 'RUNNING', 'DONE', 'FAILED']
+    # Dotted path of the function running the job
+    func = models.CharField(max_length=200)
+    params = jsonfield.JSONField(default=empty_dict)
+    status = models.CharField(max_length=20,
+                              choices=zip(STATUS_OPTIONS, STATUS_OPTIONS),
+                              default='PENDING', db_index=True)
+    result = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Identifies the current claim, a requeued job is claimed anew
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'created': self.created.isoformat(),
+            'started': self.started and self.started.isoformat(),
+            'finished': self.finished and self.finished.isoformat(),
+        }
+
+
+class CoordEvents(models.Model):
+    """
+    Requests and replies of an AS at the SCION Coordination Service, as
+    last polled for the account of an organisation admin, see
+    ad_manager.util.coord_events.
+    """
+    account = models.ForeignKey(OrganisationAdmin)
+    ad = models.ForeignKey(AD)
+    join_requests = jsonfield.JSONField(default=empty_list)
+    conn_requests = jsonfield.JSONField(default=empty_list)
+    conn_replies = jsonfield.JSONField(default=empty_list)
+    # Time of the last successful poll
+    polled = models.DateTimeField(null=True, blank=True)
+    # Error of the last poll, if it failed
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        unique_together = (('account', 'ad'),)
@@ -0,0 +1,71 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import threading
+from contextlib import contextmanager
+
+# External packages
+from django.dispatch import Signal
+
+
+# Sent after the infrastructure elements of an AS were replaced as a whole
+topology_changed = Signal(providing_args=['ad'])
+
+_deferred = threading.local()
+
+
+def _deferred_ad_ids():
+    if not hasattr(_deferred, 'ad_ids'):
+        _deferred.ad_ids = set()
+    return _deferred.ad_ids
+
+
+def suspend_topology_updates(ad_id):
+    """
+    Marks the AS as being updated as a whole, so receivers can ignore the
+    signals of its individual elements.
+    :returns: False if the AS was already suspended.
+    :rtype: bool
+    """
+    ad_ids = _deferred_ad_ids()
+    if ad_id in ad_ids:
+        return False
+    ad_ids.add(ad_id)
+    return True
+
+
+def resume_topology_updates(ad_id):
+    _deferred_ad_ids().discard(ad_id)
+
+
+def topology_updates_suspended(ad_id):
+    return ad_id in _deferred_ad_ids()
+
+
+@contextmanager
+def topology_update(ad):
+    """
+    Groups the element changes of the given AS done within the block and
+    sends a single topology_changed signal once the block completes.
+    :param AD ad: The AS being updated.
+    """
+    outermost = suspend_topology_updates(ad.id)
+    try:
+        yield
+    finally:
+        if outermost:
+            resume_topology_updates(ad.id)
+    if outermost:
+        topology_changed.send(sender=ad.__class__, ad=ad)
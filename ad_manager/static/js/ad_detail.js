@@ -123,9 +123,9 @@ function displayLogs() {
     });
 }
 
-$(document).ready(function () {
+function bindConfirmations(root) {
     // "Are you sure?" confirmation boxes
-    $('.click-confirm').click(function (e) {
+    root.find('.click-confirm').click(function (e) {
         var confirmation = $(this).data('confirmation') || 'Are you sure?';
         var res = confirm(confirmation);
         if (!res) {
@@ -133,6 +133,27 @@ $(document).ready(function () {
         }
         return res;
     });
+}
+
+function loadRequests() {
+    // Both requests tabs are fetched when the first one of them is opened
+    var $tabs = $('.requests-tab');
+    if ($tabs.data('loaded')) {
+        return;
+    }
+    $tabs.data('loaded', true);
+    $.getJSON($('#requests_from_own').data('url')).done(function (data) {
+        $('#requests_from_own').html(data['html']['requests_from_own']);
+        $('#requests_from_others').html(data['html']['requests_from_others']);
+        bindConfirmations($tabs);
+    }).fail(function () {
+        $tabs.data('loaded', false);
+        $tabs.html('<br /><i>Could not load the requests.</i>');
+    });
+}
+
+$(document).ready(function () {
+    bindConfirmations($(document));
 
     // Status tab callbacks
     initServerStatus();
@@ -153,8 +174,14 @@ $(document).ready(function () {
     $tabLink.on("shown.bs.tab", function (e) {
         if ($(e.target).attr('href') == '#servers') {
             updateServerStatus();
+        } else if ($($(e.target).attr('href')).hasClass('requests-tab')) {
+            loadRequests();
         }
     });
+    // A requests tab may already be open (see makeTabsPersistent)
+    if ($('.requests-tab.active').length > 0) {
+        loadRequests();
+    }
 
     // Status control forms
     statusControl();
@@ -42,7 +42,7 @@ function checkFreshness(isd_id, as_id) {
                 } else {
                     overlayAlert("Data submitted", 1000);
                     submit = true;
-                    document.getElementById("topologyForm").submit();
+                    submitTopology();
                 }
             }
         }
@@ -55,6 +55,38 @@ function checkFreshness(isd_id, as_id) {
     return submit;
 }
 
+function submitTopology() {
+    // the configuration is generated by a background job, poll its status
+    var form = $('#topologyForm');
+    $.post(form.attr('action'), form.serialize(), function (res) {
+        if (res['status_url'] === undefined) {
+            overlayAlert(res['data'], 3000);
+            $('#submitButton')[0].innerHTML = "Save to topology file";
+            return;
+        }
+        $('#submitButton')[0].innerHTML = "Generating...";
+        pollJob(res['status_url']);
+    });
+}
+
+function pollJob(statusUrl) {
+    $.getJSON(statusUrl, function (job) {
+        if (job['status'] == 'DONE') {
+            overlayAlert("Configuration generated", 1000);
+            setTimeout(function () {
+                window.location.reload();
+            }, 1000);
+        } else if (job['status'] == 'FAILED') {
+            overlayAlert("Generating the configuration failed: " + job['result'], 5000);
+            $('#submitButton')[0].innerHTML = "Save to topology file";
+        } else {
+            setTimeout(function () {
+                pollJob(statusUrl);
+            }, 1000);
+        }
+    });
+}
+
 function overlayAlert(message, duration) {
     var pageOverlay = document.createElement("div");
     var bodyHeight = document.body.scrollHeight;
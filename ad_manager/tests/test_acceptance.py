@@ -21,6 +21,10 @@ from guardian.shortcuts import assign_perm
 
 # SCION-WEB
 from ad_manager.models import ISD, AD
+from ad_manager.util.network_graph import (
+    build_as_graph,
+    build_partial_as_graph,
+)
 
 
 class BasicWebTest(WebTest):
@@ -150,6 +154,113 @@ class TestAdDetail(BasicWebTest):
                           'Invalid label: core')
 
 
+class TestTopoHash(BasicWebTest):
+
+    def test_topo_hash(self):
+        ad = self.ads[1]
+        ad.save()
+        url = reverse('topo_hash', args=[ad.isd_id, ad.as_id])
+        with self.assertNumQueries(1):
+            response = self.app.get(url)
+        self.assertEqual(response.json['topo_hash'], ad.topo_hash)
+        self.assertEqual(response.json['topology_version'],
+                         ad.topology_version)
+        response = self.app.get(reverse('topo_hash', args=[1, 100]))
+        self.assertEqual(response.json['topo_hash'], -1)
+
+
+class TestNetworkView(BasicWebTest):
+
+    def test_full_graph(self):
+        with self.assertNumQueries(2):
+            graph = build_as_graph()
+        names = [node['name'] for node in graph['nodes']]
+        self.assertEqual(len(names), len(self.ads))
+        self.assertIn('AS 10-7', names)
+        links = {(names[l['source']], names[l['target']])
+                 for l in graph['links']}
+        self.assertEqual(len(links), len(graph['links']))
+        self.assertEqual(len(links), 7)
+        self.assertIn(('AS 1-1', 'AS 2-3'), links)
+        self.assertIn(('AS 10-6', 'AS 10-7'), links)
+
+    def test_partial_graph(self):
+        pov_as = self.ads[1]
+        # One router query per level plus one AS query per expanded level
+        with self.assertNumQueries(3):
+            graph = build_partial_as_graph(pov_as, 1)
+        names = [node['name'] for node in graph['nodes']]
+        self.assertEqual(names, ['AS 1-1', 'AS 1-2', 'AS 2-3'])
+        self.assertEqual(graph['nodes'][0]['pov'], 1)
+        self.assertEqual(len(graph['links']), 2)
+
+        graph = build_partial_as_graph(pov_as, 2)
+        names = {node['name'] for node in graph['nodes']}
+        self.assertEqual(names, {'AS 1-1', 'AS 1-2', 'AS 2-3', 'AS 2-4',
+                                 'AS 2-5', 'AS 10-6'})
+        # AS 2-4 and AS 2-5 are both on the last level but linked
+        self.assertEqual(len(graph['links']), 6)
+
+    def _get_graph_names(self, url, params=None):
+        graph = self.app.get(url, params).json
+        return {node['name'] for node in graph['nodes']}
+
+    def test_partial_graph_depth_param(self):
+        url = reverse('network_graph_as', args=[1, 1])
+        self.assertEqual(self._get_graph_names(url, {'depth': '0'}),
+                         {'AS 1-1'})
+        names = self._get_graph_names(url, {'depth': '1'})
+        self.assertIn('AS 2-3', names)
+        self.assertNotIn('AS 2-4', names)
+        # Invalid values fall back to the default depth
+        names = self._get_graph_names(url, {'depth': 'abc'})
+        self.assertIn('AS 10-6', names)
+        self.assertNotIn('AS 10-7', names)
+        # Large values are capped
+        names = self._get_graph_names(url, {'depth': '1000'})
+        self.assertIn('AS 10-7', names)
+
+    def test_network_page(self):
+        network_page = self.app.get(reverse('network_view'))
+        self.assertContains(network_page, 'Full network graph')
+        self.assertContains(network_page, reverse('network_graph'))
+        network_page = self.app.get(reverse('network_view_as', args=[1, 1]))
+        self.assertContains(network_page, 'Network graph for')
+        self.assertContains(network_page,
+                            reverse('network_graph_as', args=[1, 1]))
+
+    def test_graph_etag(self):
+        url = reverse('network_graph')
+        graph = self.app.get(url)
+        self.assertEqual(len(graph.json['nodes']), len(self.ads))
+        etag = graph.headers['ETag']
+        self.assertIn('Last-Modified', graph.headers)
+        self.app.get(url, headers={'If-None-Match': etag}, status=304)
+        # Any change of the graph invalidates the ETag
+        ad = self.ads[3]
+        ad.is_core_ad = not ad.is_core_ad
+        ad.save()
+        graph = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(graph.status_int, 200)
+        self.assertNotEqual(graph.headers['ETag'], etag)
+        # Fields not shown in the graph do not, also for deferred instances
+        etag = graph.headers['ETag']
+        ad.certificate = 'changed'
+        ad.save()
+        light = AD.objects.light().get(id=ad.id)
+        light.is_open = not light.is_open
+        light.save()
+        self.app.get(url, headers={'If-None-Match': etag}, status=304)
+        light.is_core_ad = not light.is_core_ad
+        light.save()
+        graph = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(graph.status_int, 200)
+        router = ad.routerweb_set.all()[0]
+        router.delete()
+        self.app.get(url, headers={'If-None-Match': graph.headers['ETag']},
+                     status=200)
+
+
 class TestUsersAndPermissions(BasicWebTestUsers):
 
     CONTROL_CLASS = 'process-control-form'
@@ -194,6 +305,10 @@ class TestConnectionRequests(BasicWebTestUsers):
         requests_page = reverse('ad_connection_requests', args=[ad_id])
         return requests_page
 
+    def _get_requests_url(self, ad):
+        return reverse('as_requests', kwargs={'isd_id': ad.isd_id,
+                                              'as_id': ad.as_id})
+
     def test_view_nopriv(self):
         ad = self.ads[2]
         requests_page = self._get_request_page(ad.as_id)
@@ -202,22 +317,31 @@ class TestConnectionRequests(BasicWebTestUsers):
         ad_requests = self.app.get(requests_page)
         self.assertNotContains(ad_requests, 'Received requests')
         self.assertNotContains(ad_requests, 'Created by')
+        self.app.get(self._get_requests_url(ad), status=302)
 
         # Non-priv user
         ad_requests = self.app.get(requests_page, user=self.user)
         self.assertNotContains(ad_requests, 'Received requests')
         self.assertNotContains(ad_requests, 'Created by')
+        self.app.get(self._get_requests_url(ad), user=self.user, status=403)
 
     def test_priv_user(self):
         ad = self.ads[2]
-        requests_page = self._get_request_page(ad.as_id)
+        requests_url = self._get_requests_url(ad)
 
-        # Admin user
-        ad_requests = self.app.get(requests_page, user=self.admin_user)
+        # The requests tabs are loaded separately
+        ad_detail = self.app.get(self._get_request_page(ad.as_id),
+                                 user=self.admin_user)
+        self.assertNotContains(ad_detail, 'Received connection requests')
+        self.assertContains(ad_detail, requests_url)
 
-        self.assertContains(ad_requests, 'Received connection requests')
+        # Admin user
+        ad_requests = self.app.get(requests_url, user=self.admin_user)
+        self.assertIn('Received connection requests',
+                      ad_requests.json['html']['requests_from_others'])
 
         # User which has access to the AD
         assign_perm('change_ad', self.user, ad)
-        ad_requests = self.app.get(requests_page, user=self.user)
-        self.assertContains(ad_requests, 'Received connection requests')
+        ad_requests = self.app.get(requests_url, user=self.user)
+        self.assertIn('Received connection requests',
+                      ad_requests.json['html']['requests_from_others'])
@@ -0,0 +1,136 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import json
+from datetime import timedelta
+
+# External packages
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+# SCION-WEB
+from ad_manager.models import Job
+from ad_manager.util.jobs import (
+    claim_job,
+    enqueue_job,
+    requeue_stale_jobs,
+    run_job,
+    run_worker,
+)
+
+
+def add_job(a, b):
+    return a + b
+
+
+def failing_job():
+    raise ValueError('broken')
+
+
+class TestJobQueue(TestCase):
+    """
+    Tests for ad_manager.util.jobs
+    """
+    def test_run(self):
+        job = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        failed = enqueue_job('ad_manager.tests.test_jobs.failing_job')
+        self.assertEqual(job.status, 'PENDING')
+        run_worker(once=True)
+        job = Job.objects.get(id=job.id)
+        self.assertEqual((job.status, job.result), ('DONE', '3'))
+        self.assertIsNotNone(job.finished)
+        failed = Job.objects.get(id=failed.id)
+        self.assertEqual((failed.status, failed.result), ('FAILED', 'broken'))
+
+    def test_claim(self):
+        first = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        second = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        # Jobs are claimed in order and only once
+        self.assertEqual(claim_job().id, first.id)
+        self.assertEqual(claim_job().id, second.id)
+        self.assertIsNone(claim_job())
+        self.assertEqual(Job.objects.get(id=first.id).status, 'RUNNING')
+
+    def test_requeue_stale(self):
+        stale = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        running = enqueue_job('ad_manager.tests.test_jobs.add_job', a=2, b=2)
+        claim_job()
+        claim_job()
+        Job.objects.filter(id=stale.id).update(
+            started=timezone.now() - timedelta(hours=2))
+        self.assertEqual(requeue_stale_jobs(timeout=3600), 1)
+        self.assertEqual(Job.objects.get(id=running.id).status, 'RUNNING')
+        # Workers requeue stale jobs before claiming the next one
+        Job.objects.filter(id=running.id).update(
+            started=timezone.now() - timedelta(hours=2))
+        run_worker(once=True)
+        self.assertEqual(Job.objects.get(id=stale.id).status, 'DONE')
+        self.assertEqual(Job.objects.get(id=running.id).result, '4')
+
+    def test_requeued_outcome_discarded(self):
+        job = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        first = claim_job()
+        Job.objects.filter(id=job.id).update(
+            started=timezone.now() - timedelta(hours=2))
+        requeue_stale_jobs(timeout=3600)
+        second = claim_job()
+        self.assertNotEqual(first.claim_token, second.claim_token)
+        # Only the run of the current claim stores its outcome
+        run_job(first)
+        self.assertEqual(Job.objects.get(id=job.id).status, 'RUNNING')
+        run_job(second)
+        self.assertEqual(Job.objects.get(id=job.id).status, 'DONE')
+
+
+class TestJobStatus(TestCase):
+    """
+    Tests for the job status API
+    """
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='owner')
+        User.objects.create_user('other', password='other')
+
+    def get_status(self, job):
+        return self.client.get(reverse('job_status', args=[job.id]))
+
+    def get_json(self, job):
+        return json.loads(self.get_status(job).content.decode())
+
+    def test_status(self):
+        job = enqueue_job('ad_manager.tests.test_jobs.add_job',
+                          self.owner, a=1, b=2)
+        self.client.login(username='owner', password='owner')
+        self.assertEqual(self.get_json(job)['status'], 'PENDING')
+        run_worker(once=True)
+        response = self.get_json(job)
+        self.assertEqual((response['status'], response['result']),
+                         ('DONE', '3'))
+
+    def test_other_user(self):
+        job = enqueue_job('ad_manager.tests.test_jobs.add_job',
+                          self.owner, a=1, b=2)
+        self.client.login(username='other', password='other')
+        self.assertEqual(self.get_status(job).status_code, 404)
+
+    def test_anonymous_job(self):
+        job = enqueue_job('ad_manager.tests.test_jobs.add_job', a=1, b=2)
+        self.assertEqual(self.get_status(job).status_code, 404)
+        self.client.login(username='other', password='other')
+        self.assertEqual(self.get_status(job).status_code, 404)
+        User.objects.create_user('staff', password='staff', is_staff=True)
+        self.client.login(username='staff', password='staff')
+        self.assertEqual(self.get_json(job)['status'], 'PENDING')
@@ -0,0 +1,351 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from shutil import rmtree
+from unittest.mock import patch
+
+# External packages
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+# SCION
+from lib.packet.scion_addr import ISD_AS
+
+# SCION-WEB
+from ad_manager.models import AD, ISD
+from ad_manager.tests.test_models import make_topology
+from ad_manager.util.local_config_generator import (
+    GEN_MANIFEST_FILE,
+    create_local_gen,
+    get_generations_dir,
+    StaticFile,
+    get_prometheus_targets_path,
+    get_template,
+    publish_as_gen,
+    read_prometheus_targets,
+    read_static_file,
+    remove_deleted_prometheus_targets,
+    render_topology_file,
+    render_topology_files,
+    rollback_as_gen,
+    update_prometheus_targets,
+    write_gen_files,
+)
+
+
+def make_gen_topology(router_count, server_count=1):
+    """
+    Build a synthetic topology dictionary which can be passed to
+    create_local_gen.
+    """
+    topo = make_topology(router_count, server_count)
+    topo['Zookeepers'] = {'1': {'Addr': '127.0.0.1', 'Port': 2181,
+                                'AddrInternal': '', 'PortInternal': None}}
+    return topo
+
+
+class LocalGenTestCase(TestCase):
+    def setUp(self):
+        isd = ISD.objects.create(id=1)
+        self.ad = AD.objects.create(isd=isd, as_id=1, certificate='cert',
+                                    trc='trc', sig_priv_key='sig',
+                                    enc_priv_key='enc', master_as_key='mk')
+        self.gen_path = tempfile.mkdtemp()
+        self.addCleanup(rmtree, self.gen_path, True)
+
+    def as_path(self, *parts):
+        return os.path.join(self.gen_path, 'ISD1', 'AS1', *parts)
+
+    def read_tree(self, path):
+        """
+        Returns the contents of all files below path keyed by their path.
+        """
+        contents = {}
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                with open(file_path) as f:
+                    contents[os.path.relpath(file_path, path)] = f.read()
+        return contents
+
+
+class TestCreateLocalGen(LocalGenTestCase):
+    """
+    Tests for ad_manager.util.local_config_generator.create_local_gen
+    """
+    def _count_queries(self, topo):
+        with CaptureQueriesContext(connection) as ctx:
+            create_local_gen('1-1', topo, self.gen_path)
+        return len(ctx.captured_queries)
+
+    def test_query_count(self):
+        # The first run lists all ASes in the top level Prometheus config
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        # The AS is loaded once, independently of the number of instances
+        small = self._count_queries(make_gen_topology(1))
+        large = self._count_queries(make_gen_topology(20, 10))
+        self.assertEqual(small, large)
+
+    def test_shared_files(self):
+        create_local_gen('1-1', make_gen_topology(2), self.gen_path)
+        endhost = self.read_tree(self.as_path('endhost'))
+        router = self.read_tree(self.as_path('br1-1-1'))
+        self.assertIn('as.yml', endhost)
+        for rel_path, content in endhost.items():
+            if rel_path != 'topology.yml':
+                self.assertEqual(router[rel_path], content)
+        self.assertIn('MasterASKey: mk', endhost['as.yml'])
+        self.assertIn('cert', router.values())
+
+    def test_parallel_writer(self):
+        topo = make_gen_topology(10, 5)
+        create_local_gen('1-1', topo, self.gen_path, workers=1)
+        serial = self.read_tree(self.gen_path)
+        rmtree(self.gen_path)
+        create_local_gen('1-1', topo, self.gen_path, workers=4)
+        self.assertEqual(self.read_tree(self.gen_path), serial)
+        self.assertIn(os.path.join('dispatcher', 'supervisord.conf'), serial)
+
+    def test_topology_files(self):
+        topo = make_gen_topology(2)
+        topo['BeaconServers']['bs1-1-1']['AddrInternal'] = '10.0.0.1'
+        topology_files = render_topology_files(topo)
+        for type_key, content in topology_files.items():
+            self.assertEqual(content, render_topology_file(topo, type_key))
+        # Rendered once per address view and shared between the types
+        self.assertIs(topology_files['BeaconServers'],
+                      topology_files['PathServers'])
+        self.assertIs(topology_files['BorderRouters'],
+                      topology_files['endhost'])
+        self.assertNotEqual(topology_files['BorderRouters'],
+                            topology_files['BeaconServers'])
+
+
+class TestIncrementalLocalGen(LocalGenTestCase):
+    """
+    Tests for the incremental mode of create_local_gen
+    """
+    def test_unchanged(self):
+        topo = make_gen_topology(3)
+        create_local_gen('1-1', topo, self.gen_path)
+        self.assertEqual(
+            create_local_gen('1-1', topo, self.gen_path, incremental=True),
+            [])
+
+    def test_changed_router(self):
+        topo = make_gen_topology(3)
+        create_local_gen('1-1', topo, self.gen_path)
+        # Unchanged files are not touched
+        with open(self.as_path('endhost', 'as.yml'), 'w') as f:
+            f.write('untouched')
+        topo['BorderRouters']['br1-1-2']['Interface']['ToAddr'] = '127.9.0.1'
+        written = create_local_gen('1-1', topo, self.gen_path,
+                                   incremental=True)
+        self.assertIn(self.as_path('br1-1-1', 'topology.yml'), written)
+        self.assertNotIn(self.as_path('br1-1-1', 'as.yml'), written)
+        with open(self.as_path('endhost', 'as.yml')) as f:
+            self.assertEqual(f.read(), 'untouched')
+        with open(self.as_path('br1-1-1', 'topology.yml')) as f:
+            self.assertIn('127.9.0.1', f.read())
+
+    def test_removed_instance(self):
+        create_local_gen('1-1', make_gen_topology(3), self.gen_path)
+        create_local_gen('1-1', make_gen_topology(2), self.gen_path,
+                         incremental=True)
+        self.assertFalse(os.path.exists(self.as_path('br1-1-3')))
+        self.assertTrue(os.path.exists(self.as_path('br1-1-2')))
+
+    def test_matches_full_rebuild(self):
+        create_local_gen('1-1', make_gen_topology(3, 2), self.gen_path)
+        topo = make_gen_topology(2, 1)
+        create_local_gen('1-1', topo, self.gen_path, incremental=True)
+        incremental = self.read_tree(self.as_path())
+        create_local_gen('1-1', topo, self.gen_path)
+        self.assertEqual(self.read_tree(self.as_path()), incremental)
+
+    def test_missing_manifest(self):
+        topo = make_gen_topology(1)
+        create_local_gen('1-1', topo, self.gen_path)
+        os.remove(self.as_path(GEN_MANIFEST_FILE))
+        written = create_local_gen('1-1', topo, self.gen_path,
+                                   incremental=True)
+        self.assertIn(self.as_path('endhost', 'as.yml'), written)
+
+    def test_hostfile_kept(self):
+        topo = make_gen_topology(2)
+        create_local_gen('1-1', topo, self.gen_path, hostfile='[hosts]\n')
+        topo['BorderRouters']['br1-1-2']['Interface']['ToAddr'] = '127.9.0.1'
+        create_local_gen('1-1', topo, self.gen_path, incremental=True)
+        # Published with the generation, kept unless a new one is rendered
+        with open(self.as_path('host.1-1')) as f:
+            self.assertEqual(f.read(), '[hosts]\n')
+        create_local_gen('1-1', topo, self.gen_path, hostfile='[new]\n')
+        with open(self.as_path('host.1-1')) as f:
+            self.assertEqual(f.read(), '[new]\n')
+
+
+class TestStagedLocalGen(LocalGenTestCase):
+    """
+    Tests for the staged publication of the AS folder
+    """
+    def generations(self):
+        return sorted(os.listdir(get_generations_dir(self.gen_path,
+                                                     ISD_AS('1-1'))))
+
+    def read_as_yml(self):
+        with open(self.as_path('endhost', 'as.yml')) as f:
+            return f.read()
+
+    def test_publication(self):
+        for _ in range(3):
+            create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        self.assertTrue(os.path.islink(self.as_path().rstrip(os.sep)))
+        # The published and the previous generation are kept
+        self.assertEqual(self.generations(), ['2', '3'])
+
+    def test_rollback(self):
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        self.ad.master_as_key = 'mk2'
+        self.ad.save()
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path,
+                         incremental=True)
+        self.assertIn('mk2', self.read_as_yml())
+        rollback_as_gen(self.gen_path, ISD_AS('1-1'))
+        # Incremental generations do not modify the previous one in place
+        self.assertIn('mk\n', self.read_as_yml())
+        with self.assertRaises(ValueError):
+            rollback_as_gen(self.gen_path, ISD_AS('1-1'))
+
+    def test_legacy_folder(self):
+        topo = make_gen_topology(1)
+        create_local_gen('1-1', topo, self.gen_path)
+        tree = self.read_tree(self.as_path())
+        # Replace the published generation with a plain folder
+        as_link = self.as_path().rstrip(os.sep)
+        target = os.path.realpath(as_link)
+        os.remove(as_link)
+        os.rename(target, as_link)
+        create_local_gen('1-1', topo, self.gen_path, incremental=True)
+        self.assertTrue(os.path.islink(as_link))
+        self.assertEqual(self.read_tree(self.as_path()), tree)
+        self.assertIn('0', self.generations())
+
+    def test_concurrent_publication(self):
+        def publish(i):
+            files = {self.as_path('endhost', name): str(i)
+                     for name in ('a', 'b', 'c')}
+            publish_as_gen(self.gen_path, ISD_AS('1-1'), files,
+                           incremental=bool(i % 2))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(publish, range(8)))
+        # The published generation is complete and nothing else leaked
+        tree = self.read_tree(self.as_path())
+        self.assertEqual(len(set(tree[os.path.join('endhost', name)]
+                                 for name in ('a', 'b', 'c'))), 1)
+        self.assertEqual(len(self.generations()), 2)
+
+
+class TestPrometheusTargets(LocalGenTestCase):
+    """
+    Tests for the top level Prometheus configuration
+    """
+    def targets_path(self, isd_as):
+        return get_prometheus_targets_path(self.gen_path, ISD_AS(isd_as))
+
+    def test_initial_scan(self):
+        AD.objects.create(isd=self.ad.isd, as_id=2)
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        self.assertEqual(read_prometheus_targets(self.gen_path),
+                         [self.targets_path('1-1'), self.targets_path('1-2')])
+
+    def test_incremental_updates(self):
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        # Existing configurations are updated without querying the ASes
+        with self.assertNumQueries(0):
+            self.assertFalse(update_prometheus_targets(
+                self.gen_path, add=[self.targets_path('1-1')]))
+            self.assertTrue(update_prometheus_targets(
+                self.gen_path, add=[self.targets_path('1-2')]))
+            self.assertTrue(update_prometheus_targets(
+                self.gen_path, remove=[self.targets_path('1-1')]))
+        self.assertEqual(read_prometheus_targets(self.gen_path),
+                         [self.targets_path('1-2')])
+
+    def test_deleted_ases(self):
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        # Creating and deleting ASes does not touch any gen folder by itself
+        ad = AD.objects.create(isd=self.ad.isd, as_id=2)
+        ad.delete()
+        self.assertEqual(read_prometheus_targets(self.gen_path),
+                         [self.targets_path('1-1')])
+        self.assertTrue(remove_deleted_prometheus_targets([(1, 1)],
+                                                          self.gen_path))
+        self.assertEqual(read_prometheus_targets(self.gen_path), [])
+
+    def test_admin_bulk_delete(self):
+        ad = AD.objects.create(isd=self.ad.isd, as_id=2)
+        create_local_gen('1-1', make_gen_topology(1), self.gen_path)
+        self.assertEqual(read_prometheus_targets(self.gen_path),
+                         [self.targets_path('1-1'), self.targets_path('1-2')])
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        with patch('ad_manager.admin.remove_deleted_prometheus_targets',
+                   partial(remove_deleted_prometheus_targets,
+                           local_gen_path=self.gen_path)):
+            self.client.post(reverse('admin:ad_manager_ad_changelist'), {
+                'action': 'delete_selected', 'post': 'yes',
+                '_selected_action': [ad.id]})
+        self.assertFalse(AD.objects.filter(id=ad.id).exists())
+        self.assertEqual(read_prometheus_targets(self.gen_path),
+                         [self.targets_path('1-1')])
+
+
+class TestStaticFiles(LocalGenTestCase):
+    """
+    Tests for the static file and template cache
+    """
+    def write_source(self, content, mtime):
+        path = os.path.join(self.gen_path, 'source.tmpl')
+        with open(path, 'w') as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_cache_invalidation(self):
+        path = self.write_source('$a', 1000)
+        self.assertIs(get_template(path), get_template(path))
+        self.assertEqual(get_template(path).substitute(a=1), '1')
+        self.write_source('$a$a', 2000)
+        self.assertEqual(read_static_file(path), '$a$a')
+        self.assertEqual(get_template(path).substitute(a=1), '11')
+
+    def test_link_static_files(self):
+        source = self.write_source('policy', 1000)
+        copied = os.path.join(self.gen_path, 'a', 'policy.yml')
+        linked = os.path.join(self.gen_path, 'b', 'policy.yml')
+        write_gen_files({copied: StaticFile(source),
+                         linked: StaticFile(source, link=True)}, workers=2)
+        self.assertTrue(os.path.samefile(source, linked))
+        self.assertFalse(os.path.samefile(source, copied))
+        with open(copied) as f:
+            self.assertEqual(f.read(), 'policy')
@@ -0,0 +1,268 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+from unittest import skipUnless
+
+# External packages
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+# SCION-WEB
+from ad_manager.models import (
+    AD,
+    ASAdjacency,
+    ConnectionRequest,
+    ISD,
+    JoinRequest,
+    RouterWeb,
+)
+from ad_manager.util.ad_connect import CORE_CONNECTION, link_ads
+from ad_manager.util.common import topology_hash
+
+
+def make_topology(router_count, server_count=1, isd_id=1, as_id=1):
+    """
+    Build a synthetic topology dictionary with the given number of border
+    routers (all connected to the same neighbor) and servers per type.
+    """
+    def server(i):
+        return {'Addr': '127.1.%s.%s' % (i // 250, i % 250 + 1),
+                'Port': 31000, 'AddrInternal': '', 'PortInternal': None}
+
+    routers = {}
+    for i in range(router_count):
+        routers['br%s-%s-%s' % (isd_id, as_id, i + 1)] = {
+            'Addr': '127.2.%s.%s' % (i // 250, i % 250 + 1),
+            'Port': 31000,
+            'Interface': {
+                'Addr': '127.3.%s.%s' % (i // 250, i % 250 + 1),
+                'ToAddr': '127.4.%s.%s' % (i // 250, i % 250 + 1),
+                'UdpPort': 50000,
+                'ToUdpPort': 50000,
+                'IFID': i + 1,
+                'ISD_AS': '%s-%s' % (isd_id, as_id + 1),
+                'LinkType': 'CHILD',
+            },
+        }
+    topo = {'Core': 0, 'BorderRouters': routers}
+    for key, prefix in [('BeaconServers', 'bs'),
+                        ('CertificateServers', 'cs'),
+                        ('PathServers', 'ps'),
+                        ('SibraServers', 'sb')]:
+        topo[key] = {'%s%s-%s-%s' % (prefix, isd_id, as_id, i + 1): server(i)
+                     for i in range(server_count)}
+    return topo
+
+
+class TestFillFromTopology(TestCase):
+    """
+    Tests for the bulk mode of AD.fill_from_topology
+    """
+    def setUp(self):
+        isd = ISD.objects.create(id=1)
+        self.ad = AD.objects.create(isd=isd, as_id=1)
+
+    def _count_queries(self, topo):
+        with CaptureQueriesContext(connection) as ctx:
+            self.ad.fill_from_topology(topo, clear=True, bulk=True)
+        return len(ctx.captured_queries)
+
+    def test_bulk_matches_regular(self):
+        topo = make_topology(5, 2)
+        self.ad.fill_from_topology(topo, clear=True, bulk=True)
+        bulk_ids = sorted(self.ad.get_all_element_ids())
+        self.ad.fill_from_topology(topo, clear=True)
+        self.assertEqual(bulk_ids, sorted(self.ad.get_all_element_ids()))
+
+    def test_bulk_diff(self):
+        self.ad.fill_from_topology(make_topology(5), clear=True, bulk=True)
+        unchanged = RouterWeb.objects.get(ad=self.ad, name='br1-1-1')
+        topo = make_topology(4)
+        topo['BorderRouters']['br1-1-2']['Interface']['ToAddr'] = '127.9.0.1'
+        self.ad.fill_from_topology(topo, clear=True, bulk=True)
+        routers = {r.name: r for r in self.ad.routerweb_set.all()}
+        self.assertEqual(len(routers), 4)
+        self.assertNotIn('br1-1-5', routers)
+        self.assertEqual(routers['br1-1-1'].id, unchanged.id)
+        self.assertEqual(routers['br1-1-2'].interface_toaddr, '127.9.0.1')
+
+    def test_bulk_keeps_unlisted_without_clear(self):
+        self.ad.fill_from_topology(make_topology(3), clear=True, bulk=True)
+        self.ad.fill_from_topology(make_topology(1), bulk=True)
+        self.assertEqual(self.ad.routerweb_set.count(), 3)
+
+    def test_bulk_query_count(self):
+        """
+        The number of queries does not depend on the number of elements.
+        Element counts are kept below the SQLite bulk insert batch size.
+        """
+        small = self._count_queries(make_topology(2, 1))
+        self.ad.routerweb_set.all().delete()
+        large = self._count_queries(make_topology(50, 10))
+        self.assertEqual(small, large)
+        # Re-applying an identical topology only reads the existing rows.
+        unchanged = self._count_queries(make_topology(50, 10))
+        self.assertLessEqual(unchanged, large)
+
+
+class TestWithElements(TestCase):
+    """
+    Tests for AD.objects.with_elements
+    """
+    def setUp(self):
+        isd = ISD.objects.create(id=1)
+        for as_id in range(1, 6):
+            ad = AD.objects.create(isd=isd, as_id=as_id)
+            ad.fill_from_topology(make_topology(3, as_id=as_id), bulk=True)
+
+    def test_topology_dicts(self):
+        expected = {ad.id: ad.generate_topology_dict()
+                    for ad in AD.objects.all()}
+        ads = list(AD.objects.with_elements())
+        with self.assertNumQueries(0):
+            for ad in ads:
+                self.assertEqual(ad.generate_topology_dict(), expected[ad.id])
+                self.assertEqual(len(list(ad.get_all_elements())), 7)
+        # One query for the ASes and one per element type
+        with self.assertNumQueries(6):
+            for ad in AD.objects.with_elements():
+                ad.generate_topology_dict()
+
+
+class TestAdjacencyIndex(TestCase):
+    """
+    Tests for the materialized AS adjacency index
+    """
+    def setUp(self):
+        isd = ISD.objects.create(id=1)
+        self.ad1 = AD.objects.create(isd=isd, as_id=1)
+        self.ad2 = AD.objects.create(isd=isd, as_id=2)
+
+    def _neighbors(self, ad):
+        return set(ASAdjacency.objects.filter(ad=ad).values_list(
+            'neighbor_isd_id', 'neighbor_as_id'))
+
+    def test_fill_from_topology(self):
+        for bulk in (False, True):
+            self.ad1.fill_from_topology(make_topology(3), clear=True,
+                                        bulk=bulk)
+            self.assertEqual(self._neighbors(self.ad1), {(1, 2)})
+            self.ad1.fill_from_topology(make_topology(0), clear=True,
+                                        bulk=bulk)
+            self.assertEqual(self._neighbors(self.ad1), set())
+
+    def test_link_ads(self):
+        link_ads(self.ad1, self.ad2, CORE_CONNECTION)
+        self.assertEqual(self._neighbors(self.ad1), {(1, 2)})
+        self.assertEqual(self._neighbors(self.ad2), {(1, 1)})
+
+    def test_router_edit(self):
+        self.ad1.fill_from_topology(make_topology(2), clear=True, bulk=True)
+        router = self.ad1.routerweb_set.get(name='br1-1-1')
+        router.neighbor_as_id = 3
+        router.save()
+        self.assertEqual(self._neighbors(self.ad1), {(1, 2), (1, 3)})
+        router.delete()
+        self.assertEqual(self._neighbors(self.ad1), {(1, 2)})
+
+    def test_as_delete(self):
+        link_ads(self.ad1, self.ad2, CORE_CONNECTION)
+        ad1_id = self.ad1.id
+        self.ad1.delete()
+        self.assertFalse(ASAdjacency.objects.filter(ad_id=ad1_id))
+        self.assertEqual(self._neighbors(self.ad2), {(1, 1)})
+
+    def test_rebuild_command(self):
+        link_ads(self.ad1, self.ad2, CORE_CONNECTION)
+        expected = set(ASAdjacency.objects.values_list(
+            'ad_id', 'neighbor_isd_id', 'neighbor_as_id'))
+        ASAdjacency.objects.all().delete()
+        call_command('rebuild_adjacency')
+        self.assertEqual(set(ASAdjacency.objects.values_list(
+            'ad_id', 'neighbor_isd_id', 'neighbor_as_id')), expected)
+
+
+class TestTopologyHash(TestCase):
+    """
+    Tests for the stored topology hash and version of AD
+    """
+    def test_hash_maintained_on_save(self):
+        isd = ISD.objects.create(id=1)
+        ad = AD.objects.create(isd=isd, as_id=1)
+        self.assertEqual(ad.topo_hash, topology_hash({}))
+        version = ad.topology_version
+        ad.fill_from_topology(make_topology(1), bulk=True)
+        self.assertEqual(ad.topo_hash, topology_hash(make_topology(1)))
+        self.assertEqual(ad.topology_version, version + 1)
+        # Saving without topology changes keeps the version
+        ad.is_open = False
+        ad.save()
+        ad = AD.objects.get(id=ad.id)
+        self.assertEqual(ad.topo_hash, topology_hash(make_topology(1)))
+        self.assertEqual(ad.topology_version, version + 1)
+        # Partial saves and deferred topologies are handled
+        ad.original_topology = {}
+        ad.save(update_fields=['original_topology'])
+        ad = AD.objects.defer('original_topology').get(id=ad.id)
+        self.assertEqual(ad.topo_hash, topology_hash({}))
+        ad.save()
+        self.assertEqual(ad.topology_version, version + 2)
+
+
+class TestLightQuerySet(TestCase):
+    """
+    Tests for AD.objects.light
+    """
+    def test_heavy_fields_deferred(self):
+        isd = ISD.objects.create(id=1)
+        AD.objects.create(isd=isd, as_id=1, original_topology={'Core': 1},
+                          certificate='cert', trc='trc')
+        with self.assertNumQueries(1):
+            ad = AD.objects.light().get(as_id=1)
+            self.assertEqual(str(ad), '1-1')
+            self.assertFalse(ad.is_core_ad)
+        self.assertEqual(ad.get_deferred_fields(), set(AD.HEAVY_FIELDS))
+        # Deferred columns are loaded on access
+        self.assertEqual(ad.original_topology, {'Core': 1})
+        self.assertEqual(ad.certificate, 'cert')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are SQLite specific')
+class TestLookupIndexes(TestCase):
+    """
+    Guards that the hot lookups are served by an index.
+    """
+    def assertUsesIndex(self, queryset):
+        table = queryset.model._meta.db_table
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        steps = [step for step in plan if table in step.split()]
+        self.assertTrue(steps, plan)
+        for step in steps:
+            self.assertIn('USING', step, plan)
+            self.assertIn('INDEX', step, plan)
+
+    def test_indexes(self):
+        self.assertUsesIndex(RouterWeb.objects.filter(
+            addr='127.0.0.1', interface_port=50000))
+        self.assertUsesIndex(RouterWeb.objects.filter(
+            neighbor_isd_id=1, neighbor_as_id=2))
+        self.assertUsesIndex(AD.objects.filter(isd_id=1, as_id=2))
+        self.assertUsesIndex(JoinRequest.objects.filter(status='SENT'))
+        self.assertUsesIndex(ConnectionRequest.objects.filter(status='SENT'))
@@ -12,17 +12,60 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+# Stdlib
+import gzip
+import io
+import os
+import tarfile
+import tempfile
+from shutil import rmtree
+from unittest.mock import patch
+
 # External packages
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from guardian.shortcuts import assign_perm
 
 # SCION-WEB
-from ad_manager.models import AD, ISD
+from ad_manager.models import (
+    AD,
+    AddressAllocation,
+    BeaconServerWeb,
+    CoordEvents,
+    ISD,
+    JoinRequest,
+    OrganisationAdmin,
+)
+from ad_manager.util.coord_client import CoordClient
+from ad_manager.util.coord_events import (
+    get_coord_events,
+    refresh_coord_events,
+    register_coord_events,
+)
+from ad_manager.util.util import poll_join_replies
+from ad_manager.util.defines import POLL_EVENTS_SVC, POLL_JOIN_REPLY_SVC
+from ad_manager.util.address_pool import (
+    allocate_address,
+    seed_address_pool,
+)
+from ad_manager.util.gen_archive import (
+    TarStream,
+    compress_stream,
+    parse_range,
+)
+from ad_manager.util.yaml_util import YAML_BACKENDS, dump_yaml, load_yaml
 from ad_manager.util.ad_connect import (
     CORE_CONNECTION,
     PARENT_CHILD_CONNECTION,
     PEER_CONNECTION,
     link_ads,
 )
+from ad_manager.tests.test_models import make_topology
+from scripts.coord_stub import CoordStub
 # SCION
 from lib.types import LinkType
 
@@ -76,3 +119,327 @@ class TestLinkAds(TestCase):
 
         # Check that there are no IP duplicates
         assert len(ip_addresses) == len(set(ip_addresses))
+
+
+class TestAddressPool(TestCase):
+    """
+    Tests for ad_manager.util.address_pool
+    """
+    def setUp(self):
+        isd = ISD.objects.create(id=1)
+        self.ad1 = AD.objects.create(isd=isd, as_id=1)
+        self.ad2 = AD.objects.create(isd=isd, as_id=2)
+
+    def _count_allocation_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            allocate_address(1, 1)
+        return len(ctx.captured_queries)
+
+    def test_allocation_queries(self):
+        link_ads(self.ad1, self.ad2, CORE_CONNECTION)
+        small = self._count_allocation_queries()
+        for _ in range(5):
+            link_ads(self.ad1, self.ad2, PEER_CONNECTION)
+        # Allocation cost does not depend on the number of elements
+        self.assertEqual(self._count_allocation_queries(), small)
+        first = allocate_address(1, 1)
+        self.assertEqual(allocate_address(1, 1), first + 1)
+
+    def test_release_on_delete(self):
+        link_ads(self.ad1, self.ad2, CORE_CONNECTION)
+        router = self.ad1.routerweb_set.get()
+        addrs = {router.addr, router.interface_addr}
+        self.assertEqual(set(AddressAllocation.objects.filter(
+            as_id=1).values_list('addr', flat=True)), addrs)
+        # The interface address is still the remote end of ad2's link
+        router.delete()
+        free = AddressAllocation.objects.filter(isd_id__isnull=True)
+        self.assertEqual(set(free.values_list('addr', flat=True)),
+                         {router.addr})
+        self.assertEqual(str(allocate_address(1, 2)), router.addr)
+        self.assertFalse(free.exists())
+        # Deleting the AS releases everything nobody links to anymore
+        self.ad2.delete()
+        self.assertFalse(AddressAllocation.objects.filter(as_id=2).exists())
+
+    def test_seed(self):
+        topo = self.ad1.generate_topology_dict()
+        topo['BorderRouters']['1'] = {
+            'Addr': '127.0.10.1', 'Port': 31000,
+            'Interface': {'Addr': '127.0.10.2', 'ToAddr': '127.0.10.3',
+                          'UdpPort': 50000, 'ToUdpPort': 50000, 'IFID': 1,
+                          'ISD_AS': '1-2', 'LinkType': 'CORE'}}
+        self.ad1.fill_from_topology(topo)
+        seed_address_pool()
+        self.assertEqual(str(allocate_address(1, 1)), '127.0.10.4')
+
+    def test_stored_topology_reserved(self):
+        released = allocate_address(1, 1)
+        AddressAllocation.objects.filter(addr=str(released)).update(
+            isd_id=None, as_id=None)
+        # A topology entered by the user, holding a released address and
+        # one above the high-water mark
+        topo = make_topology(0, 0, isd_id=1, as_id=2)
+        topo['BeaconServers'] = {'bs1-2-1': {
+            'Addr': str(released), 'Port': 31000, 'AddrInternal': '',
+            'PortInternal': None}}
+        topo['PathServers'] = {'ps1-2-1': {
+            'Addr': '127.0.50.1', 'Port': 31000, 'AddrInternal': '',
+            'PortInternal': None}}
+        self.ad2.fill_from_topology(topo, clear=True, bulk=True)
+        self.assertEqual(str(allocate_address(1, 1)), '127.0.50.2')
+        self.assertTrue(AddressAllocation.objects.filter(
+            addr=str(released), isd_id=1, as_id=2).exists())
+
+    def test_shared_address_kept(self):
+        shared = str(allocate_address(1, 1))
+        own = BeaconServerWeb.objects.create(ad=self.ad1, addr=shared,
+                                             port=31000)
+        # The topology of ad2 uses the address allocated for ad1
+        BeaconServerWeb.objects.create(ad=self.ad2, addr=shared, port=31000)
+        own.delete()
+        self.assertTrue(AddressAllocation.objects.filter(
+            addr=shared, isd_id=1, as_id=1).exists())
+        self.ad1.delete()
+        self.assertTrue(AddressAllocation.objects.filter(
+            addr=shared, as_id=1).exists())
+        self.assertNotEqual(str(allocate_address(1, 2)), shared)
+
+
+class TestYamlBackends(TestCase):
+    """
+    Tests for ad_manager.util.yaml_util
+    """
+    def test_round_trip(self):
+        topo = make_topology(3, 2)
+        dumps = {backend: dump_yaml(topo, backend=backend)
+                 for backend in YAML_BACKENDS}
+        for backend, text in dumps.items():
+            self.assertEqual(load_yaml(text, backend=backend), topo)
+        # All backends produce the same files
+        self.assertEqual(len(set(dumps.values())), 1)
+
+
+class TestGenArchive(TestCase):
+    """
+    Tests for ad_manager.util.gen_archive
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(rmtree, self.root, True)
+        self.files = {
+            'endhost/topology.yml': b'topology',
+            'br1-1-1/keys/as-sig.key': b'k' * 1000,
+            'br1-1-1/empty': b'',
+        }
+        for rel_path, content in self.files.items():
+            path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+    def test_archive(self):
+        archive = TarStream(self.root)
+        data = b''.join(archive.iter_range())
+        self.assertEqual(len(data), archive.size)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            contents = {member.name: tar.extractfile(member).read()
+                        for member in tar.getmembers()}
+        self.assertEqual(contents, self.files)
+        compressed = b''.join(compress_stream(archive.iter_range(), 'gzip'))
+        self.assertEqual(gzip.decompress(compressed), data)
+
+    def test_ranges(self):
+        archive = TarStream(self.root)
+        data = b''.join(archive.iter_range())
+        for start, end in [(0, 0), (10, 600), (511, 1600),
+                           (1000, archive.size - 1)]:
+            self.assertEqual(b''.join(archive.iter_range(start, end)),
+                             data[start:end + 1])
+        self.assertEqual(TarStream(self.root).etag, archive.etag)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=10-', 100), (10, 99))
+        self.assertEqual(parse_range('bytes=10-20', 100), (10, 20))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        for header in [None, 'bytes=1-2,5-6', 'bytes=20-10', 'items=1-2']:
+            self.assertIsNone(parse_range(header, 100))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+
+
+class TestCoordClient(TestCase):
+    """
+    Tests for ad_manager.util.coord_client against the coordination stub
+    """
+    def setUp(self):
+        self.stub = CoordStub().start()
+        self.addCleanup(self.stub.stop)
+        self.coord = CoordClient(retries=2, backoff=0)
+        self.addCleanup(self.coord.close)
+
+    def url(self, svc):
+        return self.stub.uri + svc + 'account/secret'
+
+    def test_keep_alive(self):
+        self.stub.join_replies[1] = {'Status': 'ACCEPTED'}
+        for _ in range(5):
+            r = self.coord.post(self.url(POLL_JOIN_REPLY_SVC),
+                                 {'request_id': 1}, idempotent=True)
+            self.assertEqual(r.json(), {'Status': 'ACCEPTED'})
+        self.assertEqual(self.stub.connections, 1)
+
+    def test_retry(self):
+        self.stub.fail_next = 2
+        r = self.coord.post(self.url(POLL_EVENTS_SVC), {'IsdAs': '1-1'},
+                             idempotent=True)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(self.stub.received), 3)
+        # Requests with side effects are not retried
+        self.stub.fail_next = 1
+        r = self.coord.post(self.url(POLL_EVENTS_SVC), {'IsdAs': '1-1'})
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(len(self.stub.received), 4)
+
+
+class TestPollJoinReplies(TestCase):
+    """
+    Tests for ad_manager.util.util.poll_join_replies
+    """
+    def setUp(self):
+        self.stub = CoordStub().start()
+        self.addCleanup(self.stub.stop)
+        self.url = self.stub.uri + POLL_JOIN_REPLY_SVC + 'account/secret'
+        unbatched_patch = patch('ad_manager.util.util._unbatched_services',
+                                set())
+        unbatched_patch.start()
+        self.addCleanup(unbatched_patch.stop)
+
+    def test_partial_failure(self):
+        self.stub.join_replies[1] = {'Status': 'DECLINED'}
+        self.stub.failing_join_requests.add(2)
+        replies, failed = poll_join_replies(self.url, list(range(1, 11)),
+                                            workers=4)
+        self.assertEqual(failed, [2])
+        self.assertEqual(replies[1], {'Status': 'DECLINED'})
+        self.assertEqual(replies[3], {})
+        self.assertEqual(len(replies), 9)
+
+    def test_batched(self):
+        self.stub.join_replies[3] = {'Status': 'DECLINED'}
+        replies, failed = poll_join_replies(self.url, list(range(1, 11)))
+        self.assertEqual(len(self.stub.received), 1)
+        self.assertEqual(failed, [])
+        self.assertEqual(replies[3], {'Status': 'DECLINED'})
+        self.assertEqual(sorted(replies), list(range(1, 11)))
+
+    def test_unbatched_fallback(self):
+        self.stub.batch_polls = False
+        self.stub.join_replies[3] = {'Status': 'DECLINED'}
+        replies, failed = poll_join_replies(self.url, [1, 2, 3])
+        self.assertEqual(replies[3], {'Status': 'DECLINED'})
+        self.assertEqual(len(self.stub.received), 4)
+        # The lack of batched polls is remembered
+        poll_join_replies(self.url, [1, 2, 3])
+        self.assertEqual(len(self.stub.received), 7)
+
+    def test_invalid_batch_fallback(self):
+        self.stub.join_replies[1] = {'Status': 'DECLINED'}
+        for batch_reply in [(200, {'JoinReplies': {'first': {}}}),
+                            (500, {})]:
+            self.stub.batch_reply = batch_reply
+            del self.stub.received[:]
+            replies, failed = poll_join_replies(self.url, [1, 2])
+            self.assertEqual(replies, {1: {'Status': 'DECLINED'}, 2: {}})
+            self.assertEqual(failed, [])
+            self.assertEqual(len(self.stub.received), 3)
+        # Temporary failures do not disable batched polls
+        self.stub.batch_reply = None
+        del self.stub.received[:]
+        poll_join_replies(self.url, [1, 2])
+        self.assertEqual(len(self.stub.received), 1)
+
+
+class TestPollJoinReplyView(TestCase):
+    """
+    Tests for the join reply poll view
+    """
+    def setUp(self):
+        self.stub = CoordStub().start()
+        self.addCleanup(self.stub.stop)
+        uri_patch = patch('ad_manager.views.COORD_SERVICE_URI', self.stub.uri)
+        uri_patch.start()
+        self.addCleanup(uri_patch.stop)
+        self.user = User.objects.create_user('admin', password='admin')
+        OrganisationAdmin.objects.create(user=self.user, account_id='account',
+                                         secret='secret')
+        self.client.login(username='admin', password='admin')
+
+    def test_malformed_reply(self):
+        good, bad = [JoinRequest.objects.create(created_by=self.user,
+                                                status='SENT')
+                     for _ in range(2)]
+        self.stub.join_replies[good.id] = {'Status': 'DECLINED',
+                                           'RespondIA': '1-1'}
+        self.stub.join_replies[bad.id] = {'RespondIA': '1-1'}
+        response = self.client.post(reverse('poll_join_reply'),
+                                    HTTP_REFERER='/')
+        # The malformed reply is reported and does not affect the other one
+        self.assertEqual(JoinRequest.objects.get(id=good.id).status,
+                         'DECLINED')
+        self.assertEqual(JoinRequest.objects.get(id=bad.id).status, 'SENT')
+        errors = [str(m) for m in get_messages(response.wsgi_request)
+                  if m.level_tag == 'error']
+        self.assertEqual(errors, ['Polling the join replies of the join '
+                                  'requests %s failed.' % bad.id])
+
+
+class TestCoordEvents(TestCase):
+    """
+    Tests for ad_manager.util.coord_events
+    """
+    def setUp(self):
+        self.stub = CoordStub().start()
+        self.addCleanup(self.stub.stop)
+        uri_patch = patch('ad_manager.util.coord_events.COORD_SERVICE_URI',
+                          self.stub.uri)
+        uri_patch.start()
+        self.addCleanup(uri_patch.stop)
+        self.user = User.objects.create_user('admin')
+        self.account = OrganisationAdmin.objects.create(
+            user=self.user, account_id='account', secret='secret')
+        isd = ISD.objects.create(id=1)
+        self.ad = AD.objects.create(isd=isd, as_id=1)
+
+    def test_refresh(self):
+        events = get_coord_events(self.account, self.ad)
+        self.assertIsNone(events.polled)
+        self.stub.events['1-1'] = {'JoinRequests': [{'RequestId': 1}],
+                                   'ConnRequests': [], 'ConnReplies': []}
+        self.assertEqual(refresh_coord_events(), 0)
+        events = get_coord_events(self.account, self.ad)
+        self.assertEqual(events.join_requests, [{'RequestId': 1}])
+        self.assertIsNotNone(events.polled)
+        # Failed polls keep the stored events
+        self.stub.events['1-1'] = {}
+        self.assertEqual(refresh_coord_events(), 1)
+        events = get_coord_events(self.account, self.ad)
+        self.assertEqual(events.join_requests, [{'RequestId': 1}])
+        self.assertTrue(events.error)
+
+    def test_register(self):
+        AD.objects.create(isd_id=1, as_id=2)
+        no_account = User.objects.create_user('other')
+        OrganisationAdmin.objects.create(user=no_account)
+        assign_perm('change_ad', self.user, self.ad)
+        assign_perm('change_ad', no_account, self.ad)
+        self.assertEqual(register_coord_events(), 1)
+        self.assertEqual(register_coord_events(), 0)
+        self.stub.events['1-1'] = {'JoinRequests': [{'RequestId': 1}],
+                                   'ConnRequests': [], 'ConnReplies': []}
+        # The ASes are polled without their page being opened
+        self.assertEqual(refresh_coord_events(), 0)
+        events = CoordEvents.objects.get()
+        self.assertEqual((events.account, events.ad), (self.account, self.ad))
+        self.assertEqual(events.join_requests, [{'RequestId': 1}])
@@ -27,6 +27,19 @@ api_patterns_internal = patterns(
     url(r'^api/v1/internal/join_requests/isd-as/(?P<isd_as>\d+-\d+)'
         '/request/(?P<request_id>\d+)/?$',
         views.join_request_action, name='join_request_action'),
+    url(r'^api/v1/internal/network/graph/?$',
+        views.network_graph, name='network_graph'),
+    url(r'^api/v1/internal/network/isd/(?P<isd_id>\d+)/as/(?P<as_id>\d+)'
+        '/graph/?$',
+        views.network_graph, name='network_graph_as'),
+    url(r'^api/v1/internal/isd/(?P<isd_id>\d+)/as/(?P<as_id>\d+)'
+        r'/gen\.tar(?P<suffix>\.gz|\.zst)?$',
+        views.as_gen_archive, name='as_gen_archive'),
+    url(r'^api/v1/internal/isd/(?P<isd_id>\d+)/as/(?P<as_id>\d+)'
+        r'/requests/?$',
+        views.as_requests, name='as_requests'),
+    url(r'^api/v1/internal/jobs/(?P<job_id>\d+)/?$',
+        views.job_status, name='job_status'),
     url(r'^api/v1/internal/.*$',
         views.wrong_api_call, name='wrong_api_call'),
 )
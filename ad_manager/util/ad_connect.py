@@ -23,14 +23,8 @@ import tempfile
 from ipaddress import ip_address
 
 # SCION
-from ad_manager.models import (
-    BeaconServerWeb,
-    CertificateServerWeb,
-    PathServerWeb,
-    RouterWeb,
-    SibraServerWeb,
-    AD)
-from ad_manager.util.common import is_private_address
+from ad_manager.models import AD
+from ad_manager.util.address_pool import allocate_address
 
 from lib.crypto.trc import get_trc_file_path
 from lib.defines import PROJECT_ROOT
@@ -86,36 +80,13 @@ def find_next_ip_local():
     return str(max_ip + 1)
 
 
-def find_next_ip_global():
-    max_ip = ip_address(IP_ADDRESS_BASE)
-
-    # Servers
-    object_groups = [PathServerWeb.objects.all(),
-                     CertificateServerWeb.objects.all(),
-                     BeaconServerWeb.objects.all(),
-                     SibraServerWeb.objects.all()]
-    for group in object_groups:
-        for element in group:
-            element_addr = ip_address(element.addr)
-            if element_addr > max_ip and is_private_address(element_addr):
-                max_ip = element_addr
-
-    # Routers
-    for router in RouterWeb.objects.all():
-        ip_addrs = [router.addr, router.interface_addr, router.interface_toaddr]
-        for addr in ip_addrs:
-            addr = ip_address(addr)
-            if addr > max_ip and is_private_address(addr):
-                max_ip = addr
-
-    return max_ip + 1
-
-
-def ip_generator():
-    next_ip = find_next_ip_global()
+def ip_generator(isd_id, as_id):
+    """
+    Yields private addresses allocated for the given AS from the address
+    pool.
+    """
     while True:
-        yield str(next_ip)
-        next_ip += 1
+        yield str(allocate_address(isd_id, as_id))
 
 
 def create_next_router(topo_dict, ip_gen):
@@ -160,11 +131,10 @@ def create_next_router(topo_dict, ip_gen):
 def link_topologies(first_topo, second_topo, connection_type):
     first_topo = copy.deepcopy(first_topo)
     second_topo = copy.deepcopy(second_topo)
-    ip_gen = ip_generator()
-    first_router_id, first_topo_router = create_next_router(first_topo,
-                                                            ip_gen)
-    second_router_id, second_topo_router = create_next_router(second_topo,
-                                                              ip_gen)
+    first_router_id, first_topo_router = create_next_router(
+        first_topo, ip_generator(first_topo['ISDID'], first_topo['ADID']))
+    second_router_id, second_topo_router = create_next_router(
+        second_topo, ip_generator(second_topo['ISDID'], second_topo['ADID']))
 
     first_router_if = first_topo_router['Interface']
     second_router_if = second_topo_router['Interface']
@@ -206,8 +176,9 @@ def link_ads(first_ad, second_ad, connection_type):
     """Needs transaction!"""
     assert isinstance(first_ad, AD)
     assert isinstance(second_ad, AD)
-    first_topo = first_ad.generate_topology_dict()
-    second_topo = second_ad.generate_topology_dict()
+    ads = AD.objects.with_elements().in_bulk([first_ad.id, second_ad.id])
+    first_topo = ads[first_ad.id].generate_topology_dict()
+    second_topo = ads[second_ad.id].generate_topology_dict()
     first_topo, second_topo = link_topologies(first_topo, second_topo,
                                               connection_type)
 
@@ -0,0 +1,250 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`address_pool` --- Private address allocator
+==================================================
+Hands out private addresses for new border routers without scanning all
+elements. Released addresses are reused first, otherwise the AddressPool
+high-water mark is advanced. Every allocation locks the pool row, so
+concurrent requests never receive the same address.
+
+An address belongs to the ISD-AS it was allocated for. It is released once
+no element of that AS uses it anymore, i.e. after the topology of the AS
+changed, after one of its elements was deleted or when the AS is deleted.
+Addresses still used by an element of any AS (e.g. as the remote end of a
+link) are kept. Addresses of a stored topology (e.g. entered by the user)
+are reserved for its AS.
+"""
+
+# Stdlib
+from ipaddress import ip_address
+
+# External packages
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+# SCION-WEB
+from ad_manager.models import (
+    AD,
+    AddressAllocation,
+    AddressPool,
+    BeaconServerWeb,
+    CertificateServerWeb,
+    PathServerWeb,
+    RouterWeb,
+    SibraServerWeb,
+)
+from ad_manager.signals import topology_changed, topology_updates_suspended
+from ad_manager.util.common import is_private_address
+
+POOL_BASE_ADDRESS = '127.0.0.1'
+SERVER_MODELS = [BeaconServerWeb, CertificateServerWeb, PathServerWeb,
+                 SibraServerWeb]
+
+
+def _element_addresses(ad=None):
+    """
+    Returns the addresses used by the elements of the given AS, or of all
+    ASes if ad is None.
+    :rtype: set
+    """
+    def elements(model):
+        return model.objects.filter(ad=ad) if ad is not None else \
+            model.objects.all()
+
+    addrs = set()
+    for model in SERVER_MODELS:
+        for row in elements(model).values_list('addr', 'addr_internal'):
+            addrs.update(row)
+    for row in elements(RouterWeb).values_list('addr', 'interface_addr',
+                                               'interface_toaddr'):
+        addrs.update(row)
+    addrs.discard(None)
+    addrs.discard('')
+    return addrs
+
+
+def _addresses_in_use(addrs):
+    """
+    Returns the given addresses which are used by an element of any AS.
+    :param set addrs: The addresses to check.
+    :rtype: set
+    """
+    in_use = set()
+    for model in SERVER_MODELS:
+        for row in model.objects.filter(
+                Q(addr__in=addrs) | Q(addr_internal__in=addrs),
+        ).values_list('addr', 'addr_internal'):
+            in_use.update(row)
+    for row in RouterWeb.objects.filter(
+            Q(addr__in=addrs) | Q(interface_addr__in=addrs) |
+            Q(interface_toaddr__in=addrs),
+    ).values_list('addr', 'interface_addr', 'interface_toaddr'):
+        in_use.update(row)
+    return in_use & addrs
+
+
+def _max_private_address(addrs):
+    max_ip = ip_address(POOL_BASE_ADDRESS)
+    for addr in addrs:
+        try:
+            addr = ip_address(addr)
+        except ValueError:
+            continue
+        if addr > max_ip and is_private_address(addr):
+            max_ip = addr
+    return max_ip
+
+
+def find_max_private_address():
+    """
+    Scans all elements for the largest private address in use.
+    :rtype: IPv4Address
+    """
+    return _max_private_address(_element_addresses())
+
+
+def _lock_pool():
+    """
+    Returns the pool row, locked until the end of the current transaction.
+    The row is created from a full scan if it is missing.
+    """
+    pool = AddressPool.objects.select_for_update().filter(id=1).first()
+    if pool is None:
+        next_addr = find_max_private_address() + 1
+        AddressPool.objects.get_or_create(
+            id=1, defaults={'next_addr': str(next_addr)})
+        pool = AddressPool.objects.select_for_update().get(id=1)
+    return pool
+
+
+def seed_address_pool():
+    """
+    Moves the high-water mark past every private address in use. Needed after
+    elements were imported with addresses not handed out by the pool.
+    """
+    next_addr = find_max_private_address() + 1
+    with transaction.atomic():
+        pool = _lock_pool()
+        if ip_address(pool.next_addr) < next_addr:
+            pool.next_addr = str(next_addr)
+            pool.save(update_fields=['next_addr'])
+
+
+def reserve_as_addresses(ad):
+    """
+    Keeps the pool from handing out the addresses used by the elements of
+    the given AS, which may have been chosen by the user: the high-water
+    mark is moved past them and released addresses among them are assigned
+    to the AS.
+    :param AD ad: The AS whose topology was stored.
+    """
+    addrs = _element_addresses(ad)
+    if not addrs:
+        return
+    next_addr = _max_private_address(addrs) + 1
+    with transaction.atomic():
+        pool = _lock_pool()
+        if ip_address(pool.next_addr) < next_addr:
+            pool.next_addr = str(next_addr)
+            pool.save(update_fields=['next_addr'])
+        AddressAllocation.objects.filter(
+            isd_id__isnull=True, addr__in=addrs,
+        ).update(isd_id=ad.isd_id, as_id=ad.as_id)
+
+
+def allocate_address(isd_id, as_id):
+    """
+    Allocates a private address for an element of the given AS.
+    :param int isd_id: The ISD of the owner AS.
+    :param int as_id: The owner AS.
+    :returns: The allocated address.
+    :rtype: IPv4Address
+    :raises ValueError: If the private address range is exhausted.
+    """
+    with transaction.atomic():
+        pool = _lock_pool()
+        free = AddressAllocation.objects.filter(
+            isd_id__isnull=True).order_by('id').first()
+        if free is not None:
+            free.isd_id = isd_id
+            free.as_id = as_id
+            free.save(update_fields=['isd_id', 'as_id'])
+            return ip_address(free.addr)
+        addr = ip_address(pool.next_addr)
+        if not is_private_address(addr):
+            raise ValueError('The private address pool is exhausted')
+        pool.next_addr = str(addr + 1)
+        pool.save(update_fields=['next_addr'])
+        AddressAllocation.objects.create(addr=str(addr), isd_id=isd_id,
+                                         as_id=as_id)
+        return addr
+
+
+def release_unused_addresses(ad):
+    """
+    Releases the addresses allocated for the given AS which no element of
+    any AS uses anymore.
+    :param AD ad: The owner AS.
+    :returns: The number of released addresses.
+    :rtype: int
+    """
+    owned = AddressAllocation.objects.filter(isd_id=ad.isd_id,
+                                             as_id=ad.as_id)
+    candidates = set(owned.values_list('addr', flat=True))
+    if not candidates:
+        return 0
+    unused = candidates - _addresses_in_use(candidates)
+    if not unused:
+        return 0
+    return owned.filter(addr__in=unused).update(isd_id=None, as_id=None)
+
+
+def release_as_addresses(isd_id, as_id):
+    """
+    Releases all addresses allocated for the given AS, except the ones still
+    used by an element of another AS (e.g. as the remote end of a link).
+    :returns: The number of released addresses.
+    :rtype: int
+    """
+    owned = AddressAllocation.objects.filter(isd_id=isd_id, as_id=as_id)
+    candidates = set(owned.values_list('addr', flat=True))
+    if not candidates:
+        return 0
+    in_use = _addresses_in_use(candidates)
+    return owned.exclude(addr__in=in_use).update(isd_id=None, as_id=None)
+
+
+@receiver(topology_changed)
+def _topology_changed(sender, ad, **kwargs):
+    reserve_as_addresses(ad)
+    release_unused_addresses(ad)
+
+
+def _element_deleted(sender, instance, **kwargs):
+    if not topology_updates_suspended(instance.ad_id):
+        release_unused_addresses(instance.ad)
+
+
+for _model in SERVER_MODELS + [RouterWeb]:
+    post_delete.connect(_element_deleted, sender=_model,
+                        dispatch_uid='address_pool_%s' % _model.__name__)
+
+
+@receiver(post_delete, sender=AD)
+def _as_deleted(sender, instance, **kwargs):
+    release_as_addresses(instance.isd_id, instance.as_id)
@@ -0,0 +1,184 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`adjacency` --- Materialized AS adjacency index
+====================================================
+Keeps the ASAdjacency table in sync with the neighbor information of the
+routers. The index of an AS is recomputed whenever one of its routers is
+saved or deleted (e.g. through the admin panel), or once per
+AD.fill_from_topology() call. Every change of the AS graph increments the
+NetworkGraphVersion, which serves as the ETag of the network graph API.
+Saving an AS only changes the graph if one of the GRAPH_FIELDS changed.
+"""
+
+# External packages
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+# SCION-WEB
+from ad_manager.models import (
+    AD,
+    ASAdjacency,
+    NetworkGraphVersion,
+    RouterWeb,
+)
+from ad_manager.signals import (
+    resume_topology_updates,
+    suspend_topology_updates,
+    topology_changed,
+    topology_updates_suspended,
+)
+
+# The fields of an AS shown in the network graph
+GRAPH_FIELDS = ('isd_id', 'as_id', 'is_core_ad')
+
+
+def refresh_adjacency(ad_id):
+    """
+    Recomputes the adjacency index rows of a single AS from its routers.
+    :param int ad_id: The primary key of the AS.
+    """
+    routers = RouterWeb.objects.filter(ad_id=ad_id,
+                                       neighbor_isd_id__isnull=False,
+                                       neighbor_as_id__isnull=False)
+    pairs = set(routers.values_list('neighbor_isd_id', 'neighbor_as_id'))
+    existing = ASAdjacency.objects.filter(ad_id=ad_id)
+    if pairs == set(existing.values_list('neighbor_isd_id',
+                                         'neighbor_as_id')):
+        return
+    with transaction.atomic():
+        existing.delete()
+        ASAdjacency.objects.bulk_create(
+            ASAdjacency(ad_id=ad_id, neighbor_isd_id=isd_id,
+                        neighbor_as_id=as_id)
+            for isd_id, as_id in pairs)
+        bump_graph_version()
+
+
+def rebuild_adjacency():
+    """
+    Rebuilds the whole adjacency index from the routers.
+    :returns: The number of adjacency rows.
+    :rtype: int
+    """
+    rows = set(RouterWeb.objects.filter(
+        neighbor_isd_id__isnull=False, neighbor_as_id__isnull=False,
+    ).values_list('ad_id', 'neighbor_isd_id', 'neighbor_as_id'))
+    with transaction.atomic():
+        ASAdjacency.objects.all().delete()
+        ASAdjacency.objects.bulk_create(
+            ASAdjacency(ad_id=ad_id, neighbor_isd_id=isd_id,
+                        neighbor_as_id=as_id)
+            for ad_id, isd_id, as_id in rows)
+        bump_graph_version()
+    return len(rows)
+
+
+def get_adjacency_rows(ad_ids=None):
+    """
+    Returns (ad_id, neighbor_isd_id, neighbor_as_id) tuples from the index.
+    :param list ad_ids: Restrict the rows to these ASes, if given.
+    """
+    rows = ASAdjacency.objects.all()
+    if ad_ids is not None:
+        rows = rows.filter(ad_id__in=ad_ids)
+    return rows.values_list('ad_id', 'neighbor_isd_id', 'neighbor_as_id')
+
+
+def get_graph_version():
+    """
+    Returns the current version of the AS graph.
+    :rtype: NetworkGraphVersion
+    """
+    graph_version, _ = NetworkGraphVersion.objects.get_or_create(id=1)
+    return graph_version
+
+
+def bump_graph_version():
+    """
+    Marks the AS graph as changed.
+    """
+    updated = NetworkGraphVersion.objects.filter(id=1).update(
+        version=F('version') + 1, modified=timezone.now())
+    if not updated:
+        NetworkGraphVersion.objects.get_or_create(id=1)
+
+
+@receiver(topology_changed)
+def _topology_changed(sender, ad, **kwargs):
+    refresh_adjacency(ad.id)
+
+
+@receiver(post_save, sender=RouterWeb)
+@receiver(post_delete, sender=RouterWeb)
+def _router_changed(sender, instance, **kwargs):
+    if not topology_updates_suspended(instance.ad_id):
+        refresh_adjacency(instance.ad_id)
+
+
+@receiver(pre_delete, sender=AD)
+def _as_deleting(sender, instance, **kwargs):
+    # The routers and the index rows are deleted together with the AS.
+    suspend_topology_updates(instance.id)
+
+
+@receiver(post_delete, sender=AD)
+def _as_deleted(sender, instance, **kwargs):
+    resume_topology_updates(instance.id)
+    bump_graph_version()
+
+
+def _saved_graph_fields(instance, update_fields):
+    """
+    Returns the GRAPH_FIELDS written by saving the given AS. Deferred fields
+    are not written.
+    """
+    deferred = instance.get_deferred_fields()
+    fields = [f for f in GRAPH_FIELDS if f not in deferred]
+    if update_fields is not None:
+        fields = [f for f in fields if f in update_fields or
+                  AD._meta.get_field(f).name in update_fields]
+    return fields
+
+
+# Connected without a sender, as the deferred instances returned by
+# AD.objects.light() are of a proxy class of AD
+@receiver(pre_save)
+def _as_saving(sender, instance, update_fields=None, **kwargs):
+    if instance._meta.concrete_model is not AD:
+        return
+    fields = _saved_graph_fields(instance, update_fields)
+    if instance.pk is None or not fields:
+        instance._graph_changed = instance.pk is None
+        return
+    stored = AD.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._graph_changed = (
+        stored is None or
+        list(stored) != [getattr(instance, f) for f in fields])
+
+
+@receiver(post_save)
+def _as_saved(sender, instance, **kwargs):
+    if instance._meta.concrete_model is AD and \
+            getattr(instance, '_graph_changed', True):
+        bump_graph_version()
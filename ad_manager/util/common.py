@@ -13,6 +13,8 @@
 # limitations under the License.
 
 # StdLib
+import hashlib
+import json
 from ipaddress import ip_address
 
 
@@ -29,3 +31,26 @@ def empty_dict():
     :rtype: dict
     """
     return {}
+
+
+def empty_list():
+    """
+    Needed for default value of JSONField.
+
+    :return: empty list
+    :rtype: list
+    """
+    return []
+
+
+def topology_hash(topology):
+    """
+    Hash of the topology for non cryptographic purposes (state comparison
+    for user warnings).
+
+    :param dict topology: The topology as a dictionary.
+    :return: MD5 hex digest of the sorted JSON representation
+    :rtype: str
+    """
+    flat_string = json.dumps(topology, sort_keys=True)
+    return hashlib.md5(flat_string.encode('utf-8')).hexdigest()
@@ -0,0 +1,113 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`coord_client` --- SCION Coordination Service client
+=========================================================
+Keeps a pool of keep-alive connections to the SCION Coordination Service, so
+requests do not pay the connection setup each time. Every request has a
+connect and a read timeout. Idempotent requests (i.e. polls) are retried with
+an exponential backoff on connection errors and on temporary server errors.
+"""
+
+# Stdlib
+import logging
+import os
+import threading
+import time
+
+# External packages
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("scion-web")
+
+# Status codes after which an idempotent request is retried
+RETRY_STATUS_CODES = (502, 503, 504)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class CoordClient(object):
+    """
+    HTTP client of the SCION Coordination Service, safe to share between
+    threads.
+    :ivar tuple timeout: the connect and the read timeout in seconds.
+    :ivar int retries: the number of retries of idempotent requests.
+    :ivar float backoff: the delay before the first retry in seconds, it is
+    doubled for every further retry.
+    :ivar int pid: the process which created the client.
+    """
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10,
+                 retries=3, backoff=0.5):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pid = os.getpid()
+        self.session = requests.Session()
+        self.session.headers['content-type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url, data, idempotent=False):
+        """
+        Posts data as JSON.
+        :param str url: the URL of the request.
+        :param dict data: the content of the request.
+        :param bool idempotent: whether the request can safely be retried.
+        :returns: the response, it may have any status code.
+        :rtype: requests.Response
+        :raises requests.RequestException: if no response was received.
+        """
+        retries = self.retries if idempotent else 0
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                r = self.session.post(url, json=data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    raise
+                logger.warning("Retrying %s after %s", url, e)
+                continue
+            if r.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return r
+            logger.warning("Retrying %s after status code %s", url,
+                           r.status_code)
+
+    def close(self):
+        self.session.close()
+
+
+def get_coord_client():
+    """
+    Returns the client shared by the process, created from the COORD_*
+    settings. Forked processes (e.g. job workers) get their own client, as
+    pooled connections must not be shared between processes.
+    :rtype: CoordClient
+    """
+    global _client
+    with _client_lock:
+        if _client is None or _client.pid != os.getpid():
+            _client = CoordClient(
+                pool_size=settings.COORD_POOL_SIZE,
+                connect_timeout=settings.COORD_CONNECT_TIMEOUT,
+                read_timeout=settings.COORD_READ_TIMEOUT,
+                retries=settings.COORD_RETRIES,
+                backoff=settings.COORD_RETRY_BACKOFF)
+        return _client
@@ -0,0 +1,161 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`coord_events` --- Stored SCION Coordination Service events
+================================================================
+The join requests, connection requests and connection replies of an AS are
+polled from the SCION Coordination Service in the background (see
+`manage.py poll_coord_events`) and stored as CoordEvents, so pages showing
+them do not wait for the service. Every AS an organisation admin with
+coordination service credentials may change is polled for the account of
+that admin.
+"""
+
+# Stdlib
+import logging
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+# External packages
+from django.conf import settings
+from django.utils import timezone
+from guardian.shortcuts import get_objects_for_user
+
+# SCION-WEB
+from ad_manager.models import AD, CoordEvents, OrganisationAdmin
+from ad_manager.util.defines import COORD_SERVICE_URI, POLL_EVENTS_SVC
+from ad_manager.util.util import post_req_to_scion_coord
+
+logger = logging.getLogger("scion-web")
+
+
+def get_coord_events(account, ad):
+    """
+    Returns the stored events of an AS, registering the AS for polling if
+    it is not yet.
+    :param OrganisationAdmin account: the account the events are polled for.
+    :param AD ad: the AS.
+    :rtype: CoordEvents
+    """
+    events, _ = CoordEvents.objects.get_or_create(account=account, ad=ad)
+    return events
+
+
+def register_coord_events():
+    """
+    Registers the ASes the organisation admins may change for polling with
+    their accounts.
+    :returns: the number of newly registered ASes.
+    :rtype: int
+    """
+    registered = set(CoordEvents.objects.values_list('account_id', 'ad_id'))
+    new = []
+    for account in OrganisationAdmin.objects.select_related('user').exclude(
+            account_id='').exclude(secret=''):
+        ads = get_objects_for_user(account.user, 'ad_manager.change_ad',
+                                   AD.objects.only('id'))
+        new.extend(CoordEvents(account=account, ad=ad) for ad in ads
+                   if (account.id, ad.id) not in registered)
+    CoordEvents.objects.bulk_create(new)
+    return len(new)
+
+
+def fetch_coord_events(account_id, secret, isd_as):
+    """
+    Polls the events of an AS from the SCION Coordination Service.
+    :param str account_id: the account at the coordination service.
+    :param str secret: the secret of the account.
+    :param str isd_as: the AS.
+    :returns: the join requests, the connection requests and the connection
+    replies.
+    :rtype: (list, list, list)
+    :raises ValueError: if the events could not be polled.
+    """
+    request_url = urljoin(COORD_SERVICE_URI, posixpath.join(
+                          POLL_EVENTS_SVC, account_id, secret))
+    r, error = post_req_to_scion_coord(
+        request_url, {'IsdAs': isd_as},
+        "poll events for ISD-AS %s" % isd_as, idempotent=True)
+    if error is not None:
+        raise ValueError(error.content.decode())
+    try:
+        resp = r.json()
+        return resp['JoinRequests'], resp['ConnRequests'], resp['ConnReplies']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid events of ISD-AS %s' % isd_as)
+
+
+def refresh_coord_events(workers=None):
+    """
+    Registers new ASes, then polls the events of all registered ASes
+    concurrently and stores them. Failed polls keep the previously stored
+    events and record the error.
+    :param int workers: the maximum number of concurrent polls.
+    :returns: the number of failed polls.
+    :rtype: int
+    """
+    if workers is None:
+        workers = settings.COORD_POLL_WORKERS
+    register_coord_events()
+    registered = list(CoordEvents.objects.select_related(
+        'account', 'ad').defer(*['ad__%s' % f for f in AD.HEAVY_FIELDS]))
+    if not registered:
+        return 0
+
+    # Built here, the worker threads must not query the database
+    polls = [(e.account.account_id, e.account.secret,
+              '{}-{}'.format(e.ad.isd_id, e.ad.as_id)) for e in registered]
+
+    def poll(args):
+        try:
+            return fetch_coord_events(*args), None
+        except ValueError as e:
+            return None, str(e)
+
+    failed = 0
+    # Only the polls run in the pool, the database is updated from here
+    with ThreadPoolExecutor(max_workers=min(workers, len(registered))) as pool:
+        for events, (polled, error) in zip(registered, pool.map(poll, polls)):
+            if polled is None:
+                failed += 1
+                events.error = error
+                events.save(update_fields=['error'])
+                continue
+            (events.join_requests, events.conn_requests,
+             events.conn_replies) = polled
+            events.polled = timezone.now()
+            events.error = ''
+            events.save()
+    return failed
+
+
+def run_events_poller(interval=None, once=False):
+    """
+    Refreshes the stored events periodically.
+    :param float interval: the seconds between the start of two refreshes.
+    :param bool once: return after the first refresh.
+    """
+    if interval is None:
+        interval = settings.COORD_EVENTS_POLL_INTERVAL
+    while True:
+        started = time.time()
+        failed = refresh_coord_events()
+        if failed:
+            logger.warning("Polling the events of %s ASes failed", failed)
+        if once:
+            return
+        time.sleep(max(interval - (time.time() - started), 0))
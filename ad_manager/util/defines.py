@@ -8,6 +8,10 @@ Contains constant definitions used for SCION web.
 DEFAULT_BANDWIDTH = 1000
 SCION_SUGGESTED_PORT = 31000
 
+# Values related to the network graph view
+DEFAULT_GRAPH_DEPTH = 2
+MAX_GRAPH_DEPTH = 10
+
 # Values related to the SCION coordination service API
 COORD_SERVICE_URI = "http://127.0.0.1:8080"
 UPLOAD_JOIN_REQUEST_SVC = "/api/as/uploadJoinRequest/"
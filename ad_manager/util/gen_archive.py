@@ -0,0 +1,170 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`gen_archive` --- Streaming tar archives of gen folders
+============================================================
+Produces tar archives of a folder straight from disk. The layout of the
+uncompressed archive is computed from the file metadata up front, so its
+size is known and any byte range can be produced on its own, e.g. to resume
+an interrupted download. Compressed archives are streamed as a whole.
+"""
+
+# Stdlib
+import hashlib
+import os
+import re
+import tarfile
+import zlib
+
+# External packages
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 64 * 1024
+COMPRESSIONS = ['gzip', 'zstd']
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class TarStream(object):
+    """
+    Uncompressed tar archive of the files below a folder.
+    :ivar str root: the archived folder, with symlinks resolved when the
+    stream is created (i.e. a published generation is pinned).
+    :ivar int size: the size of the archive in bytes.
+    :ivar str etag: identifies the layout and the metadata of the archive.
+    """
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        # (offset, length, bytes or path of the member content)
+        self._segments = []
+        self.size = 0
+        etag = hashlib.sha1(self.root.encode())
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names.sort()
+            for name in sorted(file_names):
+                path = os.path.join(dir_path, name)
+                header = self._header(path)
+                etag.update(header)
+                self._add(header)
+                self._add(path, os.path.getsize(path))
+                self._add(bytes(-self.size % tarfile.BLOCKSIZE))
+        # End of archive marker, padded to a full record
+        self._add(bytes(2 * tarfile.BLOCKSIZE))
+        self._add(bytes(-self.size % tarfile.RECORDSIZE))
+        self.etag = '"%s"' % etag.hexdigest()
+
+    def _header(self, path):
+        stat = os.stat(path)
+        info = tarfile.TarInfo(os.path.relpath(path, self.root))
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = stat.st_mode & 0o7777
+        return info.tobuf(format=tarfile.GNU_FORMAT)
+
+    def _add(self, content, length=None):
+        if length is None:
+            length = len(content)
+        if length:
+            self._segments.append((self.size, length, content))
+            self.size += length
+
+    def iter_range(self, start=0, end=None):
+        """
+        Yields the bytes of the archive from start to end (inclusive).
+        :param int start: the offset of the first byte.
+        :param int end: the offset of the last byte, defaults to the end.
+        """
+        if end is None:
+            end = self.size - 1
+        for offset, length, content in self._segments:
+            first = max(start, offset)
+            last = min(end, offset + length - 1)
+            if first > last:
+                continue
+            if isinstance(content, bytes):
+                yield content[first - offset:last - offset + 1]
+            else:
+                for chunk in _read_file_range(content, first - offset,
+                                              last - first + 1):
+                    yield chunk
+
+
+def _read_file_range(path, start, count):
+    """
+    Yields count bytes of the file from start. Files which shrank while the
+    archive is streamed are padded with zeros to keep the archive layout.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while count > 0:
+            chunk = f.read(min(CHUNK_SIZE, count))
+            if not chunk:
+                yield bytes(count)
+                return
+            count -= len(chunk)
+            yield chunk
+
+
+def compress_stream(chunks, compression):
+    """
+    Compresses a stream of bytes.
+    :param iterable chunks: the bytes to compress.
+    :param str compression: one of COMPRESSIONS.
+    :raises ValueError: if the compression is not available.
+    """
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif compression == 'zstd' and zstandard is not None:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        raise ValueError('Compression %s is not available' % compression)
+    return _compress(chunks, compressor)
+
+
+def _compress(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def parse_range(header, size):
+    """
+    Parses the value of a Range header with a single byte range.
+    :param str header: the Range header, if any.
+    :param int size: the size of the resource.
+    :returns: the first and the last requested byte, or None if the whole
+    resource is to be sent (i.e. no or an unsupported range).
+    :rtype: tuple
+    :raises ValueError: if the range is not satisfiable.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range, i.e. the last bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError('Range %s not satisfiable' % header)
+    return start, end
@@ -14,6 +14,7 @@
 
 # Stdlib
 import configparser
+import io
 import json
 import os
 from collections import defaultdict
@@ -131,20 +132,28 @@ def get_section_attr(mockup_dict, section_name, attr):
     return [(sec_id, section[sec_id][attr]) for sec_id in section]
 
 
-def generate_ansible_hostfile(topology_params, mockup_dict, isd_as,
-                              commit_hash):
+def get_hostfile_name(isd_as):
     """
-    Generate the host file for Ansible
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :returns: the name of the host file in the gen folder of the AS.
+    :rtype: str
+    """
+    return 'host.{}-{}'.format(isd_as[0], isd_as[1])
+
+
+def render_ansible_hostfile(topology_params, mockup_dict, isd_as,
+                            commit_hash):
+    """
+    Renders the host file for Ansible, to be published with the gen folder
+    of the AS (see create_local_gen()).
     The hostfile is per AS and can have the same IP in multiple roles
+    :returns: the host file.
+    :rtype: str
     """
-    # Write Ansible hostfile
     config = configparser.ConfigParser(allow_no_value=True, delimiters=' ',
                                        inline_comment_prefixes='#')
     isd_id, as_id = ISD_AS(isd_as)
     as_obj = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
-    host_file_path = os.path.join(WEB_ROOT, 'gen',
-                                  'ISD' + str(isd_id), 'AS' + str(as_id),
-                                  'host.{}-{}'.format(isd_id, as_id))
     scion_nodes = []  # entries for the scion_node section
     for key, service_type in [('BeaconServer', 'beacon_server'),
                               ('CertificateServer', 'cert_server'),
@@ -190,5 +199,6 @@ def generate_ansible_hostfile(topology_params, mockup_dict, isd_as,
     config.set('scion_nodes:vars', 'local_gen={}'.format(local_gen_path))
     config.set('scion_nodes:vars', 'scion_version={}'.format(commit_hash))
 
-    with open(host_file_path, 'w') as configfile:
-        config.write(configfile, space_around_delimiters=False)
+    configfile = io.StringIO()
+    config.write(configfile, space_around_delimiters=False)
+    return configfile.getvalue()
@@ -0,0 +1,140 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`jobs` --- Background jobs
+===============================
+A job queue kept in the database, so no message broker is needed. Views
+enqueue a Job naming the function to run together with its (JSON
+serializable) keyword arguments and return right away. The workers started
+by `manage.py run_jobs` claim pending jobs and record their outcome, which
+the UI polls through the job status API.
+"""
+
+# Stdlib
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+# External packages
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# SCION-WEB
+from ad_manager.models import Job
+
+logger = logging.getLogger("scion-web")
+
+
+def enqueue_job(func, user=None, **params):
+    """
+    Queues a job for the workers.
+    :param str func: dotted path of the function running the job, it is
+    called with params as keyword arguments.
+    :param User user: the user the job is run for, if any.
+    :returns: the queued job.
+    :rtype: Job
+    """
+    if user is not None and not user.is_authenticated():
+        user = None
+    return Job.objects.create(func=func, params=params, created_by=user)
+
+
+def claim_job():
+    """
+    Marks the oldest pending job as running. The status is changed with a
+    conditional update, so a job is claimed by exactly one worker. Every
+    claim gets a new token, see run_job().
+    :returns: the claimed job, or None if no job is pending.
+    :rtype: Job
+    """
+    while True:
+        job_id = Job.objects.filter(status='PENDING').order_by(
+            'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(id=job_id, status='PENDING').update(
+            status='RUNNING', started=timezone.now(),
+            claim_token=uuid.uuid4().hex)
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+
+def requeue_stale_jobs(timeout=None):
+    """
+    Puts jobs back in the queue which are running for longer than timeout,
+    i.e. whose worker most likely died.
+    :param float timeout: seconds after which a running job is stale.
+    :returns: the number of requeued jobs.
+    :rtype: int
+    """
+    if timeout is None:
+        timeout = settings.JOB_TIMEOUT
+    stale = Job.objects.filter(
+        status='RUNNING',
+        started__lt=timezone.now() - timedelta(seconds=timeout))
+    count = stale.update(status='PENDING', started=None, claim_token='')
+    if count:
+        logger.warning('Requeued %s stale jobs', count)
+    return count
+
+
+def run_job(job):
+    """
+    Runs a claimed job and stores its outcome. The result of a failed job is
+    the error message, the traceback is logged. The outcome is discarded if
+    the job was requeued in the meantime, i.e. its claim token changed.
+    :param Job job: the job to run.
+    :returns: the finished job.
+    :rtype: Job
+    """
+    try:
+        result = import_string(job.func)(**job.params)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.id, job.func)
+        job.status = 'FAILED'
+        job.result = str(e) or e.__class__.__name__
+    else:
+        job.status = 'DONE'
+        job.result = '' if result is None else str(result)
+    job.finished = timezone.now()
+    stored = Job.objects.filter(id=job.id, status='RUNNING',
+                                claim_token=job.claim_token).update(
+        status=job.status, result=job.result, finished=job.finished)
+    if not stored:
+        logger.warning('Job %s (%s) was requeued while running, its outcome '
+                       'is discarded', job.id, job.func)
+    return job
+
+
+def run_worker(poll_interval=None, once=False):
+    """
+    Runs pending jobs, one at a time. Stale jobs of dead workers are
+    requeued before each claim.
+    :param float poll_interval: seconds to wait while no job is pending.
+    :param bool once: return as soon as no job is pending.
+    """
+    if poll_interval is None:
+        poll_interval = settings.JOB_POLL_INTERVAL
+    while True:
+        requeue_stale_jobs()
+        job = claim_job()
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -14,14 +14,22 @@
 
 # Stdlib
 import configparser
+import fcntl
+import hashlib
+import io
+import json
 import logging
 import os
+import threading
 import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from copy import deepcopy
-from shutil import rmtree
+from shutil import copytree, rmtree
 from string import Template
 
 # External packages
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 
 # SCION
@@ -39,7 +47,6 @@ from lib.defines import (
 )
 from lib.packet.scion_addr import ISD_AS
 from lib.util import (
-    copy_file,
     read_file,
     write_file,
 )
@@ -53,7 +60,9 @@ from topology.generator import PrometheusGenerator
 
 # SCION-WEB
 from ad_manager.models import AD
+from ad_manager.util.hostfile_generator import get_hostfile_name
 from ad_manager.util.simple_config.simple_config import check_simple_conf_mode
+from ad_manager.util.yaml_util import dump_yaml, load_yaml
 
 
 WEB_ROOT = os.path.join(PROJECT_ROOT, 'sub', 'web')
@@ -75,36 +84,205 @@ TYPES_TO_KEYS = {
     'sibra_server': 'SibraServers'
 }
 
+# Content hashes of the files of an AS, see sync_as_gen_files()
+GEN_MANIFEST_FILE = '.manifest.json'
+# Folder of the gen path holding the generations of every AS folder, see
+# publish_as_gen()
+GEN_GENERATIONS_DIR = '.generations'
 
-def create_local_gen(isdas, tp):
+# Static files and templates, see read_static_file() and get_template()
+_static_cache = {}
+_static_cache_lock = threading.Lock()
+
+# Types whose topology file lists the external addresses of the servers
+EXTERNAL_ADDR_KEYS = ('BorderRouters', 'endhost')
+
+
+def create_local_gen(isdas, tp, local_gen_path=None, workers=None,
+                     incremental=False, hostfile=None):
     """
     Creates the usual gen folder structure for an ISD/AS under web_scion/gen,
-    ready for Ansible deployment
+    ready for Ansible deployment. All files are rendered in memory first and
+    then written by a pool of writer threads.
     :param str isdas: ISD-AS as a string
     :param dict tp: the topology parameter file as a dict of dicts
+    :param str local_gen_path: the gen folder, defaults to web_scion/gen
+    :param int workers: the number of writer threads, defaults to
+    settings.GEN_WRITER_WORKERS
+    :param bool incremental: only write the changed files of the AS instead
+    of rebuilding its folder, see sync_as_gen_files()
+    :param str hostfile: the Ansible host file of the AS, the published one
+    is kept if None.
+    The folder of the AS is published atomically, see publish_as_gen().
+    :returns: the absolute paths of the written files of the AS.
+    :rtype: list
     """
     ia = ISD_AS(isdas)
-    check_simple_conf_mode(tp, ia[0], ia[1])
-    local_gen_path = os.path.join(WEB_ROOT, 'gen')
-    write_dispatcher_config(local_gen_path)
-    as_path = 'ISD%s/AS%s/' % (ia[0], ia[1])
+    as_obj = get_object_or_404(AD, isd_id=ia[0], as_id=ia[1])
+    check_simple_conf_mode(tp, ia[0], ia[1], as_obj)
+    if local_gen_path is None:
+        local_gen_path = os.path.join(WEB_ROOT, 'gen')
+    if workers is None:
+        workers = settings.GEN_WRITER_WORKERS
     as_path = get_elem_dir(local_gen_path, ia, "")
-    rmtree(as_path, True)
+    as_files = prep_as_gen_files(tp, ia, as_obj, local_gen_path)
+    as_files.update(prep_prometheus_config(tp, local_gen_path, as_path))
+    hostfile_path = os.path.join(as_path, get_hostfile_name(ia))
+    if hostfile is None and os.path.exists(hostfile_path):
+        hostfile = read_file(hostfile_path)
+    if hostfile is not None:
+        as_files[hostfile_path] = hostfile
+    write_gen_files(prep_dispatcher_files(local_gen_path), workers)
+    written = publish_as_gen(local_gen_path, ia, as_files, workers,
+                             incremental)
+    update_prometheus_targets(
+        local_gen_path, add=[get_prometheus_targets_path(local_gen_path, ia)])
+    return written
+
+
+def prep_as_gen_files(tp, isd_as, as_obj, local_gen_path):
+    """
+    Renders the files of all instances of the AS, including the endhost and
+    the Zookeeper configuration.
+    :param dict tp: the topology as a dict of dicts.
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :param AD as_obj: the AS to render the files for.
+    :param str local_gen_path: The gen path of scion-web.
+    :returns: the file contents keyed by their absolute path.
+    :rtype: dict
+    """
+    files = {}
+    # The crypto material and the AS config are identical for all instances
+    as_files = prep_as_files(as_obj, isd_as)
+    topology_files = render_topology_files(tp)
     for service_type, type_key in TYPES_TO_KEYS.items():
         executable_name = TYPES_TO_EXECUTABLES[service_type]
         instances = tp[type_key].keys()
         for instance_name in instances:
             config = prep_supervisord_conf(executable_name, service_type,
-                                           instance_name, ia)
-            instance_path = get_elem_dir(local_gen_path, ia, instance_name)
-            write_certs_trc_keys(ia, instance_path)
-            write_as_conf_and_path_policy(ia, instance_path)
-            write_supervisord_config(config, instance_path)
-            write_topology_file(tp, type_key, instance_path)
-            write_zlog_file(service_type, instance_name, instance_path)
-    write_endhost_config(tp, ia, local_gen_path)
-    generate_zk_config(tp, ia, local_gen_path)
-    generate_prometheus_config(tp, local_gen_path, as_path)
+                                           instance_name, isd_as)
+            instance_path = get_elem_dir(local_gen_path, isd_as,
+                                         instance_name)
+            add_files(files, instance_path, as_files)
+            add_files(files, instance_path, {
+                'supervisord.conf': render_supervisord_config(config),
+                'topology.yml': topology_files[type_key],
+                '%s.zlog.conf' % instance_name: render_zlog_file(
+                    service_type, instance_name),
+            })
+    endhost_path = get_elem_dir(local_gen_path, isd_as, 'endhost')
+    add_files(files, endhost_path, as_files)
+    add_files(files, endhost_path,
+              {'topology.yml': topology_files['endhost']})
+    for zk_id, zk in tp['Zookeepers'].items():
+        instance_name = 'zk%s-%s-%s' % (isd_as[0], isd_as[1], zk_id)
+        zk_conf_path = get_elem_dir(local_gen_path, isd_as, instance_name)
+        add_files(files, zk_conf_path,
+                  {'zoo.cfg': render_zk_conf(zk, as_obj)})
+    return files
+
+
+def add_files(files, instance_path, rel_files):
+    """
+    Adds the given files of an instance to the files to write.
+    :param dict files: the file contents keyed by their absolute path.
+    :param str instance_path: the folder of the instance.
+    :param dict rel_files: the file contents keyed by their path relative to
+    the instance folder.
+    """
+    for rel_path, content in rel_files.items():
+        files[os.path.join(instance_path, rel_path)] = content
+
+
+def write_gen_files(files, workers=1):
+    """
+    Writes the rendered files, concurrently if more than one worker is
+    given. Missing folders are created.
+    :param dict files: the file contents keyed by their absolute path.
+    :param int workers: the number of writer threads.
+    """
+    if workers <= 1:
+        for path, content in files.items():
+            write_gen_file(path, content)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consuming the results re-raises the first failed write
+        list(executor.map(lambda item: write_gen_file(*item), files.items()))
+
+
+def write_gen_file(path, content):
+    """
+    Writes a single rendered file. Static files are hard-linked to their
+    source if requested, and copied if linking is not possible (e.g. across
+    file systems).
+    :param str path: the absolute path of the file.
+    :param content: the content of the file.
+    :type content: str or StaticFile
+    """
+    if isinstance(content, StaticFile):
+        if content.link:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.lexists(path):
+                os.remove(path)
+            try:
+                os.link(content.path, path)
+                return
+            except OSError:
+                pass
+        content = content.read()
+    write_file(path, content)
+
+
+class StaticFile(object):
+    """
+    File of the gen folder with the same content as a file of the SCION
+    source tree.
+    :ivar str path: the source file.
+    :ivar bool link: whether to hard-link instead of copying the source file.
+    """
+    def __init__(self, path, link=False):
+        self.path = path
+        self.link = link
+
+    def read(self):
+        return read_static_file(self.path)
+
+
+def read_static_file(path):
+    """
+    Returns the content of a static file. The content is cached until the
+    modification time of the file changes.
+    :param str path: the file to read.
+    :rtype: str
+    """
+    return _cached_load(path, read_file)
+
+
+def get_template(path):
+    """
+    Returns the parsed template stored in the given file. The template is
+    cached until the modification time of the file changes.
+    :param str path: the template file.
+    :rtype: Template
+    """
+    return _cached_load(path, _load_template)
+
+
+def _load_template(path):
+    return Template(read_static_file(path))
+
+
+def _cached_load(path, load):
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, load.__name__)
+    with _static_cache_lock:
+        cached = _static_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    value = load(path)
+    with _static_cache_lock:
+        _static_cache[key] = (mtime, value)
+    return value
 
 
 def topo_instance(tp, type_key):
@@ -120,7 +298,7 @@ def topo_instance(tp, type_key):
                     'AddrInternal')
                 internal_port = singular_topo[server_type][entry].pop(
                     'PortInternal')
-                if type_key in ('BorderRouters', 'endhost'):
+                if type_key in EXTERNAL_ADDR_KEYS:
                     continue  # Routers and endhost only know about external
                 if internal_address != '':
                     singular_topo[server_type][entry]['Addr'] = internal_address
@@ -218,113 +396,291 @@ def prep_dispatcher_supervisord_conf():
     return config
 
 
-def write_topology_file(tp, type_key, instance_path):
+def render_topology_file(tp, type_key):
     """
-    Writes the topology file into the instance's location.
+    Renders the topology file of an instance of the given service type.
     :param dict tp: the topology as a dict of dicts.
     :param str type_key: key to describe service type.
-    :param instance_path: the folder to write the file into.
+    :returns: the topology file as YAML.
+    :rtype: str
     """
-    path = os.path.join(instance_path, 'topology.yml')
     topo = topo_instance(tp, type_key)
-    with open(path, 'w') as file:
-        yaml.dump(topo, file, default_flow_style=False)
+    return dump_yaml(topo)
 
 
-def write_endhost_config(tp, isd_as, local_gen_path):
+def publish_as_gen(local_gen_path, isd_as, files, workers=1,
+                   incremental=False):
     """
-    Writes the endhost folder into the given location.
+    Builds a new generation of the AS folder in a staging folder and
+    publishes it by atomically replacing the symlink at the AS folder path.
+    Readers resolving the AS folder always see a complete generation. The
+    previous generation is kept for rollback_as_gen(), older ones are removed.
+    In incremental mode the staging folder starts as a hard-linked copy of
+    the published generation. Concurrent publications of the same AS are
+    serialized by as_gen_lock().
+    :param str local_gen_path: The gen path of scion-web.
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :param dict files: the file contents of the AS folder keyed by their
+    absolute path.
+    :param int workers: the number of writer threads.
+    :param bool incremental: whether to reuse the unchanged files.
+    :returns: the absolute paths of the written files, below the AS folder.
+    :rtype: list
+    """
+    as_path = get_elem_dir(local_gen_path, isd_as, "")
+    as_link = as_path.rstrip(os.sep)
+    gens_dir = get_generations_dir(local_gen_path, isd_as)
+    with as_gen_lock(local_gen_path, isd_as):
+        os.makedirs(gens_dir, exist_ok=True)
+        staging = os.path.join(gens_dir, str(_next_generation(gens_dir)))
+        if incremental and os.path.isdir(as_link):
+            copytree(as_link, staging, copy_function=os.link)
+        staged_files = {
+            os.path.join(staging, os.path.relpath(path, as_path)): content
+            for path, content in files.items()}
+        written = sync_as_gen_files(staging, staged_files, workers,
+                                    incremental)
+        if os.path.isdir(as_link) and not os.path.islink(as_link):
+            # Folder written before generations were introduced
+            previous = os.path.join(gens_dir, '0')
+            rmtree(previous, True)
+            os.rename(as_link, previous)
+        else:
+            previous = os.path.realpath(as_link)
+        _swap_symlink(as_link, staging)
+        for name in os.listdir(gens_dir):
+            path = os.path.join(gens_dir, name)
+            if path not in (staging, previous):
+                rmtree(path, True)
+    return [os.path.join(as_path, os.path.relpath(path, staging))
+            for path in written]
+
+
+@contextmanager
+def as_gen_lock(local_gen_path, isd_as, purpose='publish'):
+    """
+    Serializes the changes to the generations of an AS folder, between
+    threads as well as processes (e.g. a request and a job worker).
+    :param str local_gen_path: The gen path of scion-web.
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :param str purpose: locks of different purposes are independent, so
+    they can be nested.
+    """
+    gens_dir = get_generations_dir(local_gen_path, isd_as)
+    os.makedirs(os.path.dirname(gens_dir), exist_ok=True)
+    with open('%s.%s.lock' % (gens_dir, purpose), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def rollback_as_gen(local_gen_path, isd_as):
+    """
+    Publishes the generation of the AS folder preceding the current one.
+    :param str local_gen_path: The gen path of scion-web.
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :returns: the folder of the published generation.
+    :rtype: str
+    :raises ValueError: if there is no previous generation.
+    """
+    as_link = get_elem_dir(local_gen_path, isd_as, "").rstrip(os.sep)
+    gens_dir = get_generations_dir(local_gen_path, isd_as)
+    with as_gen_lock(local_gen_path, isd_as):
+        if not os.path.islink(as_link):
+            raise ValueError('AS %s has no published generation' % isd_as)
+        current = int(os.path.basename(os.path.realpath(as_link)))
+        older = [gen for gen in _generations(gens_dir) if gen < current]
+        if not older:
+            raise ValueError('AS %s has no previous generation' % isd_as)
+        previous = os.path.join(gens_dir, str(max(older)))
+        _swap_symlink(as_link, previous)
+    return previous
+
+
+def get_generations_dir(local_gen_path, isd_as):
+    """
+    :returns: the folder holding the generations of the AS folder.
+    :rtype: str
+    """
+    return os.path.join(local_gen_path, GEN_GENERATIONS_DIR,
+                        'ISD%s' % isd_as[0], 'AS%s' % isd_as[1])
+
+
+def _generations(gens_dir):
+    return [int(name) for name in os.listdir(gens_dir) if name.isdigit()]
+
+
+def _next_generation(gens_dir):
+    return max(_generations(gens_dir) or [0]) + 1
+
+
+def _swap_symlink(link, target):
+    """
+    Atomically points the symlink at the given target folder.
+    """
+    tmp_link = link + '.new'
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(target, os.path.dirname(link)), tmp_link)
+    os.replace(tmp_link, link)
+
+
+def sync_as_gen_files(as_path, files, workers=1, incremental=False):
+    """
+    Brings the gen folder of an AS in line with the rendered files and
+    records their hashes in the manifest of the AS. In incremental mode only
+    files whose content changed are written, and only instances and files
+    which are no longer rendered are removed. Without incremental mode or a
+    readable manifest the folder is rebuilt from scratch.
+    :param str as_path: the gen folder of the AS.
+    :param dict files: the file contents keyed by their absolute path.
+    :param int workers: the number of writer threads.
+    :param bool incremental: whether to reuse the unchanged files.
+    :returns: the absolute paths of the written files.
+    :rtype: list
+    """
+    hashes = {os.path.relpath(path, as_path): content_hash(content)
+              for path, content in files.items()}
+    manifest = read_gen_manifest(as_path) if incremental else None
+    if manifest is None:
+        rmtree(as_path, True)
+        changed = files
+    else:
+        remove_stale_files(as_path, manifest, hashes)
+        changed = {}
+        for path, content in files.items():
+            rel_path = os.path.relpath(path, as_path)
+            if manifest.get(rel_path) == hashes[rel_path]:
+                if os.path.exists(path):
+                    continue
+            elif os.path.exists(path):
+                # Never write through a hard link into another generation
+                os.remove(path)
+            changed[path] = content
+    write_gen_files(changed, workers)
+    manifest_path = os.path.join(as_path, GEN_MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    write_file(manifest_path, json.dumps(hashes, sort_keys=True, indent=4))
+    return sorted(changed)
+
+
+def content_hash(content):
+    """
+    :param content: the content of a file.
+    :type content: str or StaticFile
+    :returns: the hex digest identifying the content.
+    :rtype: str
+    """
+    if isinstance(content, StaticFile):
+        content = content.read()
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def read_gen_manifest(as_path):
+    """
+    Reads the manifest written by the last sync_as_gen_files() call.
+    :param str as_path: the gen folder of the AS.
+    :returns: the content hashes keyed by the path relative to as_path, or
+    None if there is no readable manifest.
+    :rtype: dict
+    """
+    try:
+        with open(os.path.join(as_path, GEN_MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def remove_stale_files(as_path, manifest, hashes):
+    """
+    Removes the files listed in the manifest which are no longer rendered.
+    Instances which disappeared are removed as a whole.
+    :param str as_path: the gen folder of the AS.
+    :param dict manifest: the hashes of the files written last time.
+    :param dict hashes: the hashes of the files rendered now.
+    """
+    instances = {rel_path.split(os.sep)[0] for rel_path in hashes}
+    for rel_path in set(manifest) - set(hashes):
+        instance = rel_path.split(os.sep)[0]
+        if instance != rel_path and instance not in instances:
+            rmtree(os.path.join(as_path, instance), True)
+            continue
+        try:
+            os.remove(os.path.join(as_path, rel_path))
+        except FileNotFoundError:
+            pass
+
+
+def render_topology_files(tp):
+    """
+    Renders the topology file of every service type and of the endhost.
+    Types seeing the same addresses share the rendered file, so the topology
+    is copied and dumped at most twice.
     :param dict tp: the topology as a dict of dicts.
-    :param ISD_AS isd_as: ISD the AS belongs to.
-    :param local_gen_path: the location to create the endhost folder in.
+    :returns: the topology files keyed by type key.
+    :rtype: dict
     """
-    endhost_path = get_elem_dir(local_gen_path, isd_as, 'endhost')
-    if not os.path.exists(endhost_path):
-        os.makedirs(endhost_path)
-    write_certs_trc_keys(isd_as, endhost_path)
-    write_as_conf_and_path_policy(isd_as, endhost_path)
-    write_topology_file(tp, 'endhost', endhost_path)
+    variants = {}
+    topology_files = {}
+    for type_key in list(TYPES_TO_KEYS.values()) + ['endhost']:
+        external = type_key in EXTERNAL_ADDR_KEYS
+        if external not in variants:
+            variants[external] = render_topology_file(tp, type_key)
+        topology_files[type_key] = variants[external]
+    return topology_files
 
 
-def write_dispatcher_config(local_gen_path):
+def prep_dispatcher_files(local_gen_path):
     """
-    Creates the supervisord and zlog files for the dispatcher and writes
-    them into the dispatcher folder.
-    :param str local_gen_path: the location to create the dispatcher folder in.
+    Renders the supervisord and zlog files of the dispatcher.
+    :param str local_gen_path: the location of the dispatcher folder.
+    :returns: the file contents keyed by their absolute path.
+    :rtype: dict
     """
+    files = {}
     disp_folder_path = os.path.join(local_gen_path, 'dispatcher')
-    if not os.path.exists(disp_folder_path):
-        os.makedirs(disp_folder_path)
     disp_supervisord_conf = prep_dispatcher_supervisord_conf()
-    write_supervisord_config(disp_supervisord_conf, disp_folder_path)
-    write_zlog_file('dispatcher', 'dispatcher', disp_folder_path)
+    add_files(files, disp_folder_path, {
+        'supervisord.conf': render_supervisord_config(disp_supervisord_conf),
+        'dispatcher.zlog.conf': render_zlog_file('dispatcher', 'dispatcher'),
+    })
+    return files
 
 
-def write_zlog_file(service_type, instance_name, instance_path):
+def render_zlog_file(service_type, instance_name):
     """
-    Creates and writes the zlog configuration file for the given element.
+    Renders the zlog configuration file for the given element.
     :param str service_type: the type of the service (e.g. beacon_server).
     :param str instance_name: the instance of the service (e.g. br1-8-1).
+    :rtype: str
     """
-    tmpl = Template(read_file(os.path.join(PROJECT_ROOT,
-                                           "topology/zlog.tmpl")))
-    cfg = os.path.join(instance_path, "%s.zlog.conf" % instance_name)
-    write_file(cfg, tmpl.substitute(name=service_type,
-                                    elem=instance_name))
+    tmpl = get_template(os.path.join(PROJECT_ROOT, "topology/zlog.tmpl"))
+    return tmpl.substitute(name=service_type, elem=instance_name)
 
 
-def write_supervisord_config(config, instance_path):
+def render_supervisord_config(config):
     """
-    Writes the given supervisord config into the provided location.
-    :param ConfigParser config: supervisord configuration to write.
-    :param instance_path: the folder to write the config into.
+    Renders the given supervisord config.
+    :param ConfigParser config: supervisord configuration to render.
+    :rtype: str
     """
-    if not os.path.exists(instance_path):
-        os.makedirs(instance_path)
-    conf_file_path = os.path.join(instance_path, 'supervisord.conf')
-    with open(conf_file_path, 'w') as configfile:
-        config.write(configfile)
+    output = io.StringIO()
+    config.write(output)
+    return output.getvalue()
 
 
-def write_certs_trc_keys(isd_as, instance_path):
+def prep_as_files(as_obj, isd_as):
     """
-    Writes the certificate and the keys for the given service
-    instance of the given AS.
-    :param ISD_AS isd_as: ISD the AS belongs to.
-    :param str instance_path: Location (in the file system) to write
-    the configuration into.
+    Renders the files every instance of the AS gets: the keys, the
+    certificate chain, the TRC, the AS configuration (i.e. as.yml) and the
+    path policy.
+    :param AD as_obj: the AS to render the files for.
+    :param ISD_AS isd_as: ISD-AS of the AS.
+    :returns: the file contents keyed by their path relative to the
+    instance folder.
+    :rtype: dict
     """
-    try:
-        as_obj = AD.objects.get(isd_id=isd_as[0], as_id=isd_as[1])
-    except AD.DoesNotExist:
-        logger.error("AS %s-%s was not found." % (isd_as[0], isd_as[1]))
-        return
-    # write keys
-    sig_path = get_sig_key_file_path(instance_path)
-    enc_path = get_enc_key_file_path(instance_path)
-    write_file(sig_path, as_obj.sig_priv_key)
-    write_file(enc_path, as_obj.enc_priv_key)
-    # write cert
-    cert_chain_path = get_cert_chain_file_path(
-        instance_path, isd_as, INITIAL_CERT_VERSION)
-    write_file(cert_chain_path, as_obj.certificate)
-    # write trc
-    trc_path = get_trc_file_path(instance_path, isd_as[0], INITIAL_TRC_VERSION)
-    write_file(trc_path, as_obj.trc)
-
-
-def write_as_conf_and_path_policy(isd_as, instance_path):
-    """
-    Writes AS configuration (i.e. as.yml) and path policy files.
-    :param ISD_AS isd_as: ISD-AS for which the config will be written.
-    :param str instance_path: Location (in the file system) to write
-    the configuration into.
-    """
-    try:
-        as_obj = AD.objects.get(isd_id=isd_as[0], as_id=isd_as[1])
-    except AD.DoesNotExist:
-        logger.error("AS %s-%s was not found." % (isd_as[0], isd_as[1]))
-        return
     conf = {
         'MasterASKey': as_obj.master_as_key,
         'RegisterTime': 5,
@@ -332,19 +688,28 @@ def write_as_conf_and_path_policy(isd_as, instance_path):
         'CertChainVersion': 0,
         'RegisterPath': True,
     }
-    conf_file = os.path.join(instance_path, AS_CONF_FILE)
-    write_file(conf_file, yaml.dump(conf, default_flow_style=False))
     path_policy_file = os.path.join(PROJECT_ROOT, DEFAULT_PATH_POLICY_FILE)
-    copy_file(path_policy_file, os.path.join(instance_path, PATH_POLICY_FILE))
+    return {
+        get_sig_key_file_path(''): as_obj.sig_priv_key,
+        get_enc_key_file_path(''): as_obj.enc_priv_key,
+        get_cert_chain_file_path('', isd_as, INITIAL_CERT_VERSION):
+            as_obj.certificate,
+        get_trc_file_path('', isd_as[0], INITIAL_TRC_VERSION): as_obj.trc,
+        AS_CONF_FILE: dump_yaml(conf),
+        PATH_POLICY_FILE: StaticFile(path_policy_file,
+                                     link=settings.GEN_LINK_STATIC_FILES),
+    }
 
 
-def generate_prometheus_config(tp, local_gen_path, as_path):
+def prep_prometheus_config(tp, local_gen_path, as_path):
     """
-    Writes Prometheus configuration files for the given AS. Currently only
-    generates for border routers.
+    Renders the Prometheus configuration files for the given AS. Currently
+    only generates for border routers.
     :param dict tp: the topology of the AS provided as a dict of dicts.
     :param str local_gen_path: The gen path of scion-web.
     :param str as_path: The path of the given AS.
+    :returns: the file contents keyed by their absolute path.
+    :rtype: dict
     """
     router_list = []
     for router in tp['BorderRouters'].values():
@@ -352,27 +717,101 @@ def generate_prometheus_config(tp, local_gen_path, as_path):
     targets_path = os.path.join(as_path, PrometheusGenerator.PROM_DIR,
                                 PrometheusGenerator.BR_TARGET_FILE)
     target_config = [{'targets': router_list}]
-    write_file(targets_path, yaml.dump(target_config, default_flow_style=False))
-    write_prometheus_config_file(as_path, [targets_path])
-    # Create the config for the top level gen directory as well.
-    file_paths = []
-    all_ases = AD.objects.all()
-    for as_obj in all_ases:
-        ia = ISD_AS.from_values(as_obj.isd_id, as_obj.as_id)
-        targets_path = os.path.join(
-            get_elem_dir(local_gen_path, ia, ""),
-            PrometheusGenerator.PROM_DIR, PrometheusGenerator.BR_TARGET_FILE)
-        file_paths.append(targets_path)
-    write_prometheus_config_file(local_gen_path, file_paths)
-
-
-def write_prometheus_config_file(path, file_paths):
-    """
-    Writes a Prometheus configuration file into the given path
-    generates for border routers.
-    :param str path: The path to write the configuration file into.
+    return {
+        targets_path: dump_yaml(target_config),
+        os.path.join(as_path, PROM_FILE):
+            render_prometheus_config([targets_path]),
+    }
+
+
+def get_prometheus_targets_path(local_gen_path, isd_as):
+    """
+    :returns: the border router target file of the AS.
+    :rtype: str
+    """
+    return os.path.join(get_elem_dir(local_gen_path, isd_as, ""),
+                        PrometheusGenerator.PROM_DIR,
+                        PrometheusGenerator.BR_TARGET_FILE)
+
+
+def read_prometheus_targets(local_gen_path):
+    """
+    Reads the target files listed by the top level Prometheus configuration.
+    :param str local_gen_path: The gen path of scion-web.
+    :returns: the target files, or None if there is no readable
+    configuration.
+    :rtype: list
+    """
+    try:
+        with open(os.path.join(local_gen_path, PROM_FILE)) as f:
+            config = load_yaml(f)
+        return list(config['scrape_configs'][0]['file_sd_configs'][0]['files'])
+    except (OSError, yaml.YAMLError, LookupError, TypeError):
+        return None
+
+
+def update_prometheus_targets(local_gen_path, add=(), remove=()):
+    """
+    Adds and removes target files of the top level Prometheus configuration.
+    The configuration is only rewritten if the set of target files changed.
+    Without a readable configuration, the target files of all ASes are
+    listed.
+    :param str local_gen_path: The gen path of scion-web.
+    :param iterable add: target files to add.
+    :param iterable remove: target files to remove.
+    :returns: whether the configuration was written.
+    :rtype: bool
+    """
+    os.makedirs(local_gen_path, exist_ok=True)
+    lock_path = os.path.join(local_gen_path, PROM_FILE + '.lock')
+    with open(lock_path, 'w') as lock:
+        # Serializes concurrent read-modify-write cycles
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        current = read_prometheus_targets(local_gen_path)
+        if current is None:
+            targets = {get_prometheus_targets_path(
+                local_gen_path, ISD_AS.from_values(isd_id, as_id))
+                for isd_id, as_id in AD.objects.values_list('isd_id',
+                                                            'as_id')}
+        else:
+            targets = set(current)
+        targets.update(add)
+        targets.difference_update(remove)
+        targets = sorted(targets)
+        if targets == current:
+            return False
+        write_file(os.path.join(local_gen_path, PROM_FILE),
+                   render_prometheus_config(targets))
+        return True
+
+
+def remove_deleted_prometheus_targets(isd_ases, local_gen_path=None):
+    """
+    Removes deleted ASes from the top level Prometheus configuration. ASes
+    are added by create_local_gen() once their gen folder is generated, so
+    this is to be called wherever ASes are deleted.
+    :param iterable isd_ases: the (ISD, AS) id pairs of the deleted ASes.
+    :param str local_gen_path: The gen path of scion-web.
+    :returns: whether the configuration was written.
+    :rtype: bool
+    """
+    if local_gen_path is None:
+        local_gen_path = os.path.join(WEB_ROOT, 'gen')
+    # Only maintained once the gen folder of scion-web was generated
+    if not os.path.exists(os.path.join(local_gen_path, PROM_FILE)):
+        return False
+    return update_prometheus_targets(local_gen_path, remove=[
+        get_prometheus_targets_path(local_gen_path,
+                                    ISD_AS.from_values(isd_id, as_id))
+        for isd_id, as_id in isd_ases])
+
+
+def render_prometheus_config(file_paths):
+    """
+    Renders a Prometheus configuration file for border routers.
     :param list file_paths: A list of file paths to be provided to
     file_sd_configs field of the configuration file.
+    :rtype: str
     """
     config = {
         'global': {
@@ -387,32 +826,17 @@ def write_prometheus_config_file(path, file_paths):
             'file_sd_configs': [{'files': file_paths}]
         }],
     }
-    write_file(os.path.join(path, PROM_FILE),
-               yaml.dump(config, default_flow_style=False))
-
-
-def generate_zk_config(tp, isd_as, local_gen_path):
-    """
-    Generates Zookeeper configuration files for Zookeeper instances of an AS.
-    :param dict tp: the topology of the AS provided as a dict of dicts.
-    :param ISD_AS isd_as: ISD-AS for which the ZK config will be written.
-    :param str local_gen_path: The gen path of scion-web.
-    """
-    for zk_id, zk in tp['Zookeepers'].items():
-        instance_name = 'zk%s-%s-%s' % (isd_as[0], isd_as[1], zk_id)
-        write_zk_conf(local_gen_path, isd_as, instance_name, zk)
+    return dump_yaml(config)
 
 
-def write_zk_conf(local_gen_path, isd_as, instance_name, zk):
+def render_zk_conf(zk, as_obj):
     """
-    Writes a Zookeeper configuration file for the given Zookeeper instance.
-    :param str local_gen_path: The gen path of scion-web.
-    :param ISD_AS isd_as: ISD-AS for which the ZK config will be written.
-    :param str instance_name: the instance of the ZK service (e.g. zk1-5-1).
+    Renders a Zookeeper configuration file for the given Zookeeper instance.
     :param dict zk: Zookeeper instance information from the topology as a
     dictionary.
+    :param AD as_obj: the AS the Zookeeper instance belongs to.
+    :rtype: str
     """
-    as_obj = get_object_or_404(AD, isd_id=isd_as[0], as_id=isd_as[1])
     conf = {
         'tickTime': 100,
         'initLimit': 10,
@@ -427,7 +851,4 @@ def write_zk_conf(local_gen_path, isd_as, instance_name, zk):
     else:
         # set the dataLogDir only if we are operating in the normal mode.
         conf['dataLogDir'] = '/run/shm/host-zk'
-
-    zk_conf_path = get_elem_dir(local_gen_path, isd_as, instance_name)
-    zk_conf_file = os.path.join(zk_conf_path, 'zoo.cfg')
-    write_file(zk_conf_file, yaml.dump(conf, default_flow_style=False))
+    return dump_yaml(conf)
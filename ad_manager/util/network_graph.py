@@ -0,0 +1,170 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Stdlib
+from collections import defaultdict
+
+# External packages
+from django.core.urlresolvers import reverse
+
+# SCION-WEB
+from ad_manager.models import AD
+from ad_manager.util.adjacency import get_adjacency_rows
+
+
+def get_node_object(as_obj):
+    """
+    Returns the D3.js node object describing the given AS.
+    :param AD as_obj: The AS to describe.
+    :rtype: dict
+    """
+    node_object = {
+        'name': 'AS %s-%s' % (as_obj.isd_id, as_obj.as_id),
+        'group': as_obj.isd_id,
+        'url': as_obj.get_absolute_url(),
+        'networkUrl': reverse('network_view_as',
+                              args=[as_obj.isd_id, as_obj.as_id]),
+        'core': int(as_obj.is_core_ad),
+    }
+    return node_object
+
+
+def get_adjacency(ases, adjacency_rows):
+    """
+    Resolves the neighbors of the given ASes through an in-memory
+    (isd_id, as_id) index.
+    :param list ases: AS objects which may appear in the graph.
+    :param iterable adjacency_rows: (ad_id, neighbor_isd_id, neighbor_as_id)
+    tuples, e.g. from the adjacency index.
+    :returns: Mapping from AS primary key to the set of primary keys of its
+    neighbors. Neighbors which do not exist in the local DB are skipped.
+    :rtype: dict
+    """
+    as_index = {(as_obj.isd_id, as_obj.as_id): as_obj.id for as_obj in ases}
+    adjacency = defaultdict(set)
+    for ad_id, neighbor_isd_id, neighbor_as_id in adjacency_rows:
+        neighbor_id = as_index.get((neighbor_isd_id, neighbor_as_id))
+        if neighbor_id is None:
+            continue
+        adjacency[ad_id].add(neighbor_id)
+        adjacency[neighbor_id].add(ad_id)
+    return adjacency
+
+
+def graph_to_d3(ases, adjacency, pov_as=None):
+    """
+    Translates an AS graph to the D3.js nodes/links format. Only links
+    between the given ASes are included.
+    :param list ases: AS objects to show, in node order.
+    :param dict adjacency: Mapping from AS primary key to the primary keys of
+    its neighbors.
+    :param AD pov_as: The AS the graph is centered around, if any.
+    :rtype: dict
+    """
+    index = {as_obj.id: i for i, as_obj in enumerate(ases)}
+    graph = {'nodes': [], 'links': []}
+    for i, as_obj in enumerate(ases):
+        node_object = get_node_object(as_obj)
+        if pov_as is not None and as_obj.id == pov_as.id:
+            node_object['pov'] = 1
+        graph['nodes'].append(node_object)
+        neighbors = sorted(index[n] for n in adjacency.get(as_obj.id, ())
+                           if n in index)
+        for n in neighbors:
+            if i < n:
+                graph['links'].append({
+                    'source': i,
+                    'target': n,
+                    'value': 1,
+                })
+    return graph
+
+
+def _get_ases_by_isd_as(isd_as_pairs):
+    """
+    Fetches the ASes with the given (isd_id, as_id) pairs in a single query.
+    :param set isd_as_pairs: (isd_id, as_id) tuples.
+    :rtype: list
+    """
+    if not isd_as_pairs:
+        return []
+    isd_ids = {isd_id for isd_id, _ in isd_as_pairs}
+    as_ids = {as_id for _, as_id in isd_as_pairs}
+    candidates = AD.objects.light().filter(isd_id__in=isd_ids,
+                                          as_id__in=as_ids)
+    return [as_obj for as_obj in candidates
+            if (as_obj.isd_id, as_obj.as_id) in isd_as_pairs]
+
+
+def get_partial_graph(pov_as, depth):
+    """
+    Collects the ASes at most 'depth' hops away from the given AS with a
+    level-synchronous BFS. Every level costs one query for the adjacency of
+    the frontier and one query for the newly discovered neighbor ASes.
+    :param AD pov_as: The AS the graph is centered around.
+    :param int depth: The maximum distance from pov_as.
+    :returns: The ASes in BFS order and the adjacency between them.
+    :rtype: (list, dict)
+    """
+    ases = [pov_as]
+    as_index = {(pov_as.isd_id, pov_as.as_id): pov_as.id}
+    adjacency = defaultdict(set)
+    frontier = [pov_as]
+    for level in range(depth + 1):
+        frontier_ids = [as_obj.id for as_obj in frontier]
+        adjacency_rows = get_adjacency_rows(frontier_ids)
+        unresolved = defaultdict(set)
+        for ad_id, neighbor_isd_id, neighbor_as_id in adjacency_rows:
+            key = (neighbor_isd_id, neighbor_as_id)
+            if key in as_index:
+                adjacency[ad_id].add(as_index[key])
+                adjacency[as_index[key]].add(ad_id)
+            else:
+                unresolved[key].add(ad_id)
+        # ASes on the last level only contribute links between known ASes
+        if level == depth:
+            break
+        frontier = sorted(_get_ases_by_isd_as(set(unresolved)),
+                          key=lambda as_obj: (as_obj.isd_id, as_obj.as_id))
+        for as_obj in frontier:
+            as_index[(as_obj.isd_id, as_obj.as_id)] = as_obj.id
+            ases.append(as_obj)
+            for ad_id in unresolved[(as_obj.isd_id, as_obj.as_id)]:
+                adjacency[ad_id].add(as_obj.id)
+                adjacency[as_obj.id].add(ad_id)
+        if not frontier:
+            break
+    return ases, adjacency
+
+
+def build_partial_as_graph(pov_as, depth):
+    """
+    Builds the D3.js payload of the AS graph around the given AS.
+    :param AD pov_as: The AS the graph is centered around.
+    :param int depth: The maximum distance from pov_as.
+    :rtype: dict
+    """
+    ases, adjacency = get_partial_graph(pov_as, depth)
+    return graph_to_d3(ases, adjacency, pov_as)
+
+
+def build_as_graph():
+    """
+    Builds the D3.js payload of the full AS graph with two queries: one for
+    all ASes and one for the adjacency index.
+    :rtype: dict
+    """
+    all_ases = list(AD.objects.light())
+    adjacency = get_adjacency(all_ases, get_adjacency_rows())
+    return graph_to_d3(all_ases, adjacency)
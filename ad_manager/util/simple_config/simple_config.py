@@ -63,14 +63,16 @@ def prep_simple_conf_con_req(as_obj, topo_dict, user):
     return con_req
 
 
-def check_simple_conf_mode(topo_dict, isd_id, as_id):
+def check_simple_conf_mode(topo_dict, isd_id, as_id, as_obj=None):
     """
     Checks if the AS is in simple mode and updates the simple_conf_mode
     accordingly.
+    :param AD as_obj: the AS, if already loaded by the caller.
     """
     services = ['BeaconServers', 'CertificateServers', 'BorderRouters',
                 'PathServers', 'SibraServers']
-    as_obj = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
+    if as_obj is None:
+        as_obj = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
     service_addrs = set()
     for service in services:
         for _, service_instance in topo_dict[service].items():
@@ -83,4 +85,4 @@ def check_simple_conf_mode(topo_dict, isd_id, as_id):
         as_obj.simple_conf_mode = True
     else:
         as_obj.simple_conf_mode = False
-    as_obj.save()
+    as_obj.save(update_fields=['simple_conf_mode'])
@@ -15,14 +15,27 @@
 # Stdlib
 import base64
 import logging
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 # External packages
+import requests
+from django.conf import settings
 from django.http import (
     HttpResponse,
     HttpResponseServerError,
 )
 
+# SCION-WEB
+from ad_manager.util.coord_client import get_coord_client
+
+# Services (scheme and host, without the account credentials of the poll
+# URL) which answered that they do not support batched join reply polls
+_unbatched_services = set()
+# Status codes of services without support for batched join reply polls,
+# other errors are considered temporary
+UNBATCHED_STATUS_CODES = (400, 404, 405, 501)
+
 
 def to_b64(bytes_input):
     return base64.b64encode(bytes_input).decode()
@@ -32,21 +45,23 @@ def from_b64(string_input):
     return base64.b64decode(string_input)
 
 
-def post_req_to_scion_coord(request_url, request_dict, description):
+def post_req_to_scion_coord(request_url, request_dict, description,
+                            idempotent=False):
     """
     Makes a POST request to the SCION Coordination Service.
     param str request_url: The URL for the POST request.
     param dict request_dict: Contents of the request as a dictionary object.
     param str description: A description string of the request to be used
     for logging purposes.
+    param bool idempotent: Whether the request is retried on failures, only
+    for requests without side effects (e.g. polls).
     returns: A tuple containing the response and a Django HTTP error response
     in case an error occurred.
     rtype: (requests.Response, django.http.HttpResponse)
     """
-
-    headers = {'content-type': 'application/json'}
     try:
-        r = requests.post(request_url, json=request_dict, headers=headers)
+        r = get_coord_client().post(request_url, request_dict,
+                                    idempotent=idempotent)
     except requests.RequestException:
         logging.error("Failed to connect to SCION Coordination Service.")
         return None, HttpResponseServerError("Failed to connect to SCION "
@@ -57,3 +72,91 @@ def post_req_to_scion_coord(request_url, request_dict, description):
         return None, HttpResponse("Sending %s returned %s" % (description,
                                   r.status_code), status=r.status_code)
     return r, None
+
+
+def poll_join_replies(request_url, jr_ids, workers=None):
+    """
+    Polls the join replies of several join requests. All IDs are sent in a
+    single batched poll. Join requests missing from its answer, and all join
+    requests if the service does not support batched polls, are polled one
+    by one, concurrently. Failed polls do not affect the others.
+    param str request_url: The URL of the join reply poll service.
+    param list jr_ids: The IDs of the join requests.
+    param int workers: The maximum number of concurrent polls.
+    returns: The join replies keyed by the join request ID (empty for
+    pending requests) and the IDs of the join requests which could not be
+    polled.
+    rtype: (dict, list)
+    """
+    if workers is None:
+        workers = settings.COORD_POLL_WORKERS
+    replies = {}
+    failed = []
+    if not jr_ids:
+        return replies, failed
+    if _coord_service(request_url) not in _unbatched_services:
+        replies.update(_poll_join_replies_batched(request_url, jr_ids))
+    remaining = [jr_id for jr_id in jr_ids if jr_id not in replies]
+    if not remaining:
+        return replies, failed
+
+    def poll(jr_id):
+        r, error = post_req_to_scion_coord(request_url, {'request_id': jr_id},
+                                           "poll join reply %s" % jr_id,
+                                           idempotent=True)
+        if error is not None:
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            logging.error("Invalid join reply for join request %s", jr_id)
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(remaining))) as pool:
+        for jr_id, reply in zip(remaining, pool.map(poll, remaining)):
+            if reply is None:
+                failed.append(jr_id)
+            else:
+                replies[jr_id] = reply
+    return replies, failed
+
+
+def _poll_join_replies_batched(request_url, jr_ids):
+    """
+    Polls the join replies of all join requests in one request. A service
+    answering that it does not support batched polls is remembered, later
+    polls go to the per request service only. Other failures only affect
+    this poll.
+    returns: The join replies the service answered, keyed by the join
+    request ID.
+    rtype: dict
+    """
+    try:
+        r = get_coord_client().post(request_url, {'request_ids': jr_ids},
+                                    idempotent=True)
+    except requests.RequestException:
+        logging.error("Failed to connect to SCION Coordination Service.")
+        return {}
+    if r.status_code in UNBATCHED_STATUS_CODES:
+        logging.info("No batched join reply polls at the SCION Coordination "
+                     "Service.")
+        _unbatched_services.add(_coord_service(request_url))
+        return {}
+    if r.status_code != 200:
+        logging.error("Batched join reply poll failed with status code %s",
+                      r.status_code)
+        return {}
+    try:
+        return {int(jr_id): reply
+                for jr_id, reply in r.json()['JoinReplies'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        logging.error("Invalid batched join replies.")
+        return {}
+
+
+def _coord_service(request_url):
+    """
+    Returns the scheme and host of a coordination service URL.
+    """
+    url = urlsplit(request_url)
+    return url.scheme, url.netloc
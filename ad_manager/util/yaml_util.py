@@ -0,0 +1,56 @@
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:mod:`yaml_util` --- YAML serialization
+=======================================
+Dumps and loads YAML with the libyaml based dumper and loader if PyYAML was
+built with libyaml, and with the pure-Python ones otherwise.
+"""
+
+# Stdlib
+from collections import OrderedDict
+
+# External packages
+import yaml
+
+# Backend name -> (dumper, loader)
+YAML_BACKENDS = OrderedDict([('python', (yaml.Dumper, yaml.SafeLoader))])
+if getattr(yaml, '__with_libyaml__', False):
+    YAML_BACKENDS['libyaml'] = (yaml.CDumper, yaml.CSafeLoader)
+DEFAULT_YAML_BACKEND = next(reversed(YAML_BACKENDS))
+
+
+def dump_yaml(data, stream=None, backend=DEFAULT_YAML_BACKEND):
+    """
+    Serializes data in block style.
+    :param data: the object to serialize.
+    :param stream: the file to write to. If None, the YAML is returned.
+    :param str backend: the name of the backend, see YAML_BACKENDS.
+    :returns: the YAML if no stream was given.
+    :rtype: str
+    """
+    dumper, _ = YAML_BACKENDS[backend]
+    return yaml.dump(data, stream, Dumper=dumper, default_flow_style=False)
+
+
+def load_yaml(stream, backend=DEFAULT_YAML_BACKEND):
+    """
+    Parses YAML consisting of plain data (i.e. no Python objects).
+    :param stream: a string or a file.
+    :param str backend: the name of the backend, see YAML_BACKENDS.
+    :raises yaml.YAMLError: if the YAML is invalid.
+    """
+    _, loader = YAML_BACKENDS[backend]
+    return yaml.load(stream, Loader=loader)
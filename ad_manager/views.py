@@ -14,7 +14,6 @@
 
 # Stdlib
 import base64
-import hashlib
 import json
 import logging
 import os
@@ -22,8 +21,6 @@ import posixpath
 import socket
 import subprocess
 import time
-import yaml
-from collections import deque
 from urllib.parse import urljoin
 
 # External packages
@@ -32,15 +29,22 @@ from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.http import (
+    Http404,
     HttpResponse,
+    HttpResponseBadRequest,
     HttpResponseForbidden,
     HttpResponseNotFound,
     JsonResponse,
+    StreamingHttpResponse,
 )
 from django.shortcuts import redirect, get_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.datastructures import MultiValueDict
 from django.utils.decorators import method_decorator
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import ListView, DetailView, FormView
 from nacl.signing import SigningKey
 
@@ -71,6 +75,7 @@ from ad_manager.models import (
     AD,
     ConnectionRequest,
     ISD,
+    Job,
     JoinRequest,
     OrganisationAdmin,
     RouterWeb,
@@ -79,20 +84,38 @@ from ad_manager.util.simple_config.simple_config import (
     prep_simple_conf_con_req,
     SimpleConfTemplate,
 )
-from ad_manager.util.hostfile_generator import generate_ansible_hostfile
+from ad_manager.util.coord_events import get_coord_events
+from ad_manager.util.hostfile_generator import render_ansible_hostfile
+from ad_manager.util.jobs import enqueue_job
 from ad_manager.util.local_config_generator import (
+    as_gen_lock,
     create_local_gen,
+    get_elem_dir,
     WEB_ROOT,
 )
+from ad_manager.util.gen_archive import (
+    COMPRESSIONS,
+    TarStream,
+    compress_stream,
+    parse_range,
+)
+from ad_manager.util.adjacency import get_graph_version
+from ad_manager.util.network_graph import (
+    build_as_graph,
+    build_partial_as_graph,
+)
 from ad_manager.util.util import (
     from_b64,
+    poll_join_replies,
     post_req_to_scion_coord,
     to_b64,
 )
+from ad_manager.util.yaml_util import dump_yaml, load_yaml
 from ad_manager.util.defines import (
     COORD_SERVICE_URI,
+    DEFAULT_GRAPH_DEPTH,
+    MAX_GRAPH_DEPTH,
     POLL_JOIN_REPLY_SVC,
-    POLL_EVENTS_SVC,
     SCION_SUGGESTED_PORT,
     UPLOAD_CONN_REQUEST_SVC,
     UPLOAD_CONN_REPLY_SVC,
@@ -140,7 +163,7 @@ class ISDDetailView(ListView):
     def get_queryset(self):
         isd = get_object_or_404(ISD, id=int(self.kwargs['pk']))
         self.isd = isd
-        queryset = isd.ad_set.all().order_by('as_id')
+        queryset = AD.objects.light().filter(isd=isd).order_by('as_id')
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -169,31 +192,39 @@ def poll_join_reply(request):
     except OrganisationAdmin.DoesNotExist:
         logger.error("Retrieving account_id and secret failed.")
         return redirect(current_page)
-    open_join_requests = JoinRequest.objects.filter(status=REQ_SENT)
-    for req in open_join_requests:
-        jr_id = req.id
-        logger.info('Pending request = %s', jr_id)
-        request_url = urljoin(COORD_SERVICE_URI, posixpath.join(
-                              POLL_JOIN_REPLY_SVC, coord.account_id,
-                              coord.secret))
-        logger.info('url = %s' % request_url)
-        r, error = post_req_to_scion_coord(request_url, {'request_id': jr_id},
-                                           "poll join reply %s" % jr_id)
-        if error is not None:
-            return error
-        handle_join_reply(request, r, jr_id)
+    jr_ids = list(JoinRequest.objects.filter(
+        status=REQ_SENT).values_list('id', flat=True))
+    logger.info('Pending requests = %s', jr_ids)
+    request_url = urljoin(COORD_SERVICE_URI, posixpath.join(
+                          POLL_JOIN_REPLY_SVC, coord.account_id,
+                          coord.secret))
+    replies, failed = poll_join_replies(request_url, jr_ids)
+    for jr_id in jr_ids:
+        if jr_id not in replies:
+            continue
+        # A malformed reply must not roll back the others
+        try:
+            with transaction.atomic():
+                handle_join_reply(request, replies[jr_id], jr_id)
+        except (KeyError, ValueError, TypeError):
+            logger.exception("Invalid join reply for join request %s: %s",
+                             jr_id, replies[jr_id])
+            failed.append(jr_id)
+    if failed:
+        messages.error(request, 'Polling the join replies of the join '
+                                'requests %s failed.' %
+                       ', '.join(str(jr_id) for jr_id in failed))
     return redirect(current_page)
 
 
-def handle_join_reply(request, reply, jr_id):
+def handle_join_reply(request, join_reply, jr_id):
     """
     Handles the join reply coming through the SCION Coordination
     Service.
     :param HttpRequest request: Django Http Request passed on via the urls.py
-    :param dict reply: Join Reply represented as dictionary.
+    :param dict join_reply: Join Reply represented as dictionary.
     :param int jr_id: The ID of the join request.
     """
-    join_reply = reply.json()
     if join_reply == {}:
         logger.info("Empty join reply for join request %s.", jr_id)
         return
@@ -585,10 +616,7 @@ class ADDetailView(DetailView):
 
         context['management_interface_ip'] = get_own_local_ip()
         context['reloaded_topology'] = ad.original_topology
-        flat_string = json.dumps(ad.original_topology, sort_keys=True)
-        # hash for non cryptographic purpose (state comparison for user warning)
-        context['reloaded_topology_hash'] = \
-            hashlib.md5(flat_string.encode('utf-8')).hexdigest()
+        context['reloaded_topology_hash'] = ad.topo_hash
         context['as_id'] = ad.as_id
         context['isd_id'] = ad.isd_id
         context['isdas'] = str(ISD_AS.from_values(ad.isd_id, ad.as_id))
@@ -604,32 +632,56 @@ class ADDetailView(DetailView):
             )
         # Permissions
         context['user_has_perm'] = self.request.user.has_perm('change_ad', ad)
-        # Connection requests tab
-        context['join_requests'] = {}
-        context['received_requests'] = {}
-        context['received_conn_replies'] = {}
-        try:
-            coord = OrganisationAdmin.objects.get(user_id=self.request.user.id)
-        except OrganisationAdmin.DoesNotExist:
-            logger.error("Retrieving account_id and secret failed!!.")
-            return context
-        request_url = urljoin(COORD_SERVICE_URI, posixpath.join(
-                              POLL_EVENTS_SVC, coord.account_id, coord.secret))
-        logger.info("Polling Events for %s", context['isdas'])
-        r, error = post_req_to_scion_coord(
-            request_url, {'IsdAs': context['isdas']},
-            "poll events for ISD-AS %s" % context['isdas'])
-        if error is not None:
-            messages.error(self.request, 'Could not poll events from SCION '
-                           'Coordination Service!')
-            return context
-        resp = r.json()
-        context['join_requests'] = resp['JoinRequests']
-        context['received_requests'] = resp['ConnRequests']
-        context['received_conn_replies'] = resp['ConnReplies']
+        # The requests tabs are loaded on demand, see as_requests()
         return context
 
 
+@login_required
+def as_requests(request, isd_id, as_id):
+    """
+    Returns the join requests, connection requests and connection replies
+    of an AS, as stored by the events poller (see
+    ad_manager.util.coord_events), together with the rendered requests
+    tabs of the AS detail page.
+    """
+    ad = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
+    _check_user_permissions(request, ad)
+    try:
+        coord = OrganisationAdmin.objects.get(user_id=request.user.id)
+    except OrganisationAdmin.DoesNotExist:
+        logger.error("Retrieving account_id and secret failed!!.")
+        events = None
+    else:
+        events = get_coord_events(coord, ad)
+    context = {
+        'object': ad,
+        'ad': ad,
+        'isdas': str(ad),
+        'user_has_perm': True,
+        'routers': ad.routerweb_set.order_by('name'),
+        'coord_events': events,
+        'join_requests': events.join_requests if events else [],
+        'received_requests': events.conn_requests if events else [],
+        'received_conn_replies': events.conn_replies if events else [],
+    }
+    return JsonResponse({
+        'join_requests': context['join_requests'],
+        'conn_requests': context['received_requests'],
+        'conn_replies': context['received_conn_replies'],
+        'polled': events.polled.isoformat() if events and events.polled
+        else None,
+        'error': events.error if events else '',
+        'html': {
+            'requests_from_own': render_to_string(
+                'ad_manager/partials/requests_from_own_as.html', context,
+                request=request),
+            'requests_from_others': render_to_string(
+                'ad_manager/partials/requests_from_other_ases.html', context,
+                request=request),
+        },
+    })
+
+
 @require_POST
 @login_required
 def simple_configuration(request, isd_id, as_id):
@@ -639,11 +691,11 @@ def simple_configuration(request, isd_id, as_id):
     yml_str = SimpleConfTemplate.substitute(
         IP=host_IP, ISD_ID=isd_id, AS_ID=as_id,
         TARGET_ISDAS=target_isdas)
-    topo_dict = yaml.load(yml_str)
+    topo_dict = load_yaml(yml_str)
     as_obj = get_object_or_404(AD, isd_id=int(isd_id), as_id=int(as_id))
     as_obj.simple_conf_mode = True
     as_obj.save()
-    as_obj.fill_from_topology(topo_dict, clear=True)
+    as_obj.fill_from_topology(topo_dict, clear=True, bulk=True)
     con_req = prep_simple_conf_con_req(as_obj, topo_dict, request.user)
     con_req_dict = prep_con_req_dict(con_req, isd_id, as_id)
     _, error = send_connection_request(request, con_req, con_req_dict)
@@ -695,22 +747,78 @@ def add_to_topology(request):
     # TODO(ercanucan): verify the other parameters of the request as well?
     req_ia.save()
     # write the updated topology file
-    create_local_gen(con_reply['RequestIA'], topo)
+    create_local_gen(con_reply['RequestIA'], topo, incremental=True)
     # save the data into DB
-    req_ia.fill_from_topology(topo, clear=True)
+    req_ia.fill_from_topology(topo, clear=True, bulk=True)
     return HttpResponse("Successfully added to topology of %s" % router.name)
 
 
 def as_topo_hash(request, isd_id, as_id):
-    try:
-        ad = AD.objects.get(as_id=as_id,
-                            isd=isd_id)
-        flat_string = json.dumps(ad.original_topology, sort_keys=True)
-        # hash for non cryptographic purpose (state comparison for user warning)
-        topo_hash = hashlib.md5(flat_string.encode('utf-8')).hexdigest()
-        return JsonResponse({'topo_hash': topo_hash})
-    except AD.DoesNotExist:
+    # Only the stored hash column is loaded, not the topology itself
+    hashes = AD.objects.filter(as_id=as_id, isd=isd_id).values_list(
+        'topo_hash', 'topology_version')
+    if not hashes:
         return JsonResponse({'topo_hash': -1})
+    topo_hash, topology_version = hashes[0]
+    return JsonResponse({'topo_hash': topo_hash,
+                         'topology_version': topology_version})
+
+
+# URL suffix -> compression of the gen archive
+ARCHIVE_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+ARCHIVE_CONTENT_TYPES = {'gzip': 'application/gzip',
+                         'zstd': 'application/zstd',
+                         None: 'application/x-tar'}
+
+
+@login_required
+def as_gen_archive(request, isd_id, as_id, suffix=None):
+    """
+    Streams a tar archive of the gen folder of an AS, read from disk while
+    it is sent. Uncompressed archives support single byte ranges (together
+    with If-Range), so interrupted downloads can be resumed.
+    """
+    ad = get_object_or_404(AD.objects.light(), isd_id=isd_id, as_id=as_id)
+    _check_user_permissions(request, ad)
+    compression = ARCHIVE_SUFFIXES.get(suffix)
+    if compression not in COMPRESSIONS + [None]:
+        return HttpResponseBadRequest('Unknown compression')
+    as_path = get_elem_dir(os.path.join(WEB_ROOT, 'gen'),
+                           ISD_AS.from_values(ad.isd_id, ad.as_id), '')
+    if not os.path.isdir(as_path):
+        return HttpResponseNotFound('No configuration was generated for AS '
+                                    '%s' % ad)
+    archive = TarStream(as_path)
+    content_type = ARCHIVE_CONTENT_TYPES[compression]
+    if compression is not None:
+        try:
+            chunks = compress_stream(archive.iter_range(), compression)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    else:
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', archive.etag) == archive.etag:
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'),
+                                         archive.size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%s' % archive.size
+                return response
+        start, end = byte_range or (0, archive.size - 1)
+        response = StreamingHttpResponse(
+            archive.iter_range(start, end), content_type=content_type,
+            status=200 if byte_range is None else 206)
+        response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range is not None:
+            response['Content-Range'] = 'bytes %s-%s/%s' % (start, end,
+                                                            archive.size)
+    response['ETag'] = archive.etag
+    response['Content-Disposition'] = 'attachment; filename="%s.tar%s"' % (
+        str(ad), suffix or '')
+    return response
 
 
 def _check_user_permissions(request, ad):
@@ -747,117 +855,74 @@ def coord_service_update(request):
     return redirect(current_page)
 
 
-def _get_partial_graph(pov_as, depth=1):
-    partial_graph = {}
-    bfs_queue = deque([[pov_as, depth]])
-    while bfs_queue:
-        next_as, as_depth = bfs_queue.popleft()
-        if next_as in partial_graph:
-            continue
-        routers = next_as.routerweb_set.all()
-        neighbors = []
-        for router in routers:
-            neighbor_as = _get_neighbor_as(router)
-            if not neighbor_as:
-                continue
-            if as_depth > 0:
-                bfs_queue.append([neighbor_as, as_depth - 1])
-            neighbors.append(neighbor_as)
-        partial_graph[next_as] = neighbors
-    return partial_graph
-
-
-def _get_neighbor_as(router):
+def _get_graph_depth(request):
+    """
+    Returns the graph depth requested via the 'depth' query parameter,
+    limited to MAX_GRAPH_DEPTH.
+    """
     try:
-        neighbor_as = AD.objects.get(isd_id=router.neighbor_isd_id,
-                                     as_id=router.neighbor_as_id)
-    except AD.DoesNotExist:
-        # if the neighbor AS does not exist in the local DB, return None
-        return None
-    return neighbor_as
-
-
-def _get_node_object(as_obj):
-    node_object = {
-        'name': 'AS %s-%s' % (as_obj.isd_id, as_obj.as_id),
-        'group': as_obj.isd_id,
-        'url': as_obj.get_absolute_url(),
-        'networkUrl': reverse('network_view_as',
-                              args=[as_obj.isd_id, as_obj.as_id]),
-        'core': int(as_obj.is_core_ad),
-    }
-    return node_object
+        depth = int(request.GET.get('depth', DEFAULT_GRAPH_DEPTH))
+    except ValueError:
+        return DEFAULT_GRAPH_DEPTH
+    return max(0, min(depth, MAX_GRAPH_DEPTH))
 
 
 def network_view_neighbors(request, isd_id, as_id):
     pov_as = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
-    depth = 2
-    partial_graph = _get_partial_graph(pov_as, depth)
-    as_with_neighbors = partial_graph.keys()
-    # Build reverse index
-    as_index_rev = {}
-    for i, as_id in enumerate(as_with_neighbors):
-        as_index_rev[as_id] = i
-    graph = {'nodes': [], 'links': []}
-    for as_obj in as_with_neighbors:
-        index = as_index_rev[as_obj]
-        neighbors = partial_graph[as_obj]
-        node_object = _get_node_object(as_obj)
-        if as_obj == pov_as:
-            node_object['pov'] = 1
-        graph['nodes'].append(node_object)
-        for n in neighbors:
-            if n not in as_index_rev:
-                continue
-            neighbor_id = as_index_rev[n]
-            if index < neighbor_id:
-                graph['links'].append({
-                    'source': index,
-                    'target': neighbor_id,
-                    'value': 1,
-                })
+    depth = _get_graph_depth(request)
+    graph_url = '%s?depth=%s' % (
+        reverse('network_graph_as', args=[isd_id, as_id]), depth)
     return render(request, 'ad_manager/network_view.html',
-                  {'data': graph,
-                   'pov_as': pov_as})
+                  {'graph_url': graph_url,
+                   'pov_as': pov_as,
+                   'depth': depth,
+                   'max_depth': MAX_GRAPH_DEPTH})
 
 
 def network_view(request):
     """
-    Prepare network graph visualization.
+    Prepare network graph visualization. The graph itself is loaded from
+    the network graph API.
     """
-    all_ases = AD.objects.all()
-    as_graph_tmp = []
-    # Direct and reverse index <-> AS mappings
-    as_index = {}
-    as_index_rev = {}
-    for i, as_obj in enumerate(all_ases):
-        as_index[i] = as_obj
-        as_index_rev[as_obj] = i
-        routers = as_obj.routerweb_set.all()
-        neighbors = []
-        for router in routers:
-            neighbor_as = _get_neighbor_as(router)
-            if neighbor_as:
-                neighbors.append(neighbor_as)
-        as_graph_tmp.append(neighbors)
-    # Build a list of [list of neighbors for every AS]
-    as_graph = []
-    for neighbors in as_graph_tmp:
-        as_graph.append([as_index_rev[n] for n in neighbors])
-    # Translate to D3.js format
-    graph = {'nodes': [], 'links': []}
-    for index, neighbors in enumerate(as_graph):
-        as_obj = as_index[index]
-        node_object = _get_node_object(as_obj)
-        graph['nodes'].append(node_object)
-        for n in neighbors:
-            if index < n:
-                graph['links'].append({
-                    'source': index,
-                    'target': n,
-                    'value': 1,
-                })
-    return render(request, 'ad_manager/network_view.html', {'data': graph})
+    return render(request, 'ad_manager/network_view.html',
+                  {'graph_url': reverse('network_graph')})
+
+
+def _graph_version(request):
+    # Shared by the ETag and Last-Modified callbacks of a request
+    if not hasattr(request, '_graph_version'):
+        request._graph_version = get_graph_version()
+    return request._graph_version
+
+
+def _graph_etag(request, isd_id=None, as_id=None):
+    version = _graph_version(request).version
+    if isd_id is None:
+        return 'graph-%s' % version
+    return 'graph-%s-%s-%s-%s' % (version, isd_id, as_id,
+                                  _get_graph_depth(request))
+
+
+def _graph_last_modified(request, isd_id=None, as_id=None):
+    return _graph_version(request).modified
+
+
+@condition(etag_func=_graph_etag, last_modified_func=_graph_last_modified)
+def network_graph(request, isd_id=None, as_id=None):
+    """
+    Returns the full AS graph, or the graph around the given AS, in the
+    D3.js nodes/links format. Repeated requests are answered with 304 as
+    long as the graph version is unchanged.
+    """
+    if isd_id is None:
+        graph = build_as_graph()
+    else:
+        pov_as = get_object_or_404(AD, isd_id=isd_id, as_id=as_id)
+        graph = build_partial_as_graph(pov_as, _get_graph_depth(request))
+    response = JsonResponse(graph)
+    # Allow caching, but make clients revalidate with the ETag
+    patch_cache_control(response, no_cache=True)
+    return response
 
 
 def wrong_api_call(request):
@@ -925,17 +990,13 @@ def name_entry_dict_router(tp):
     return ret_dict
 
 
-@require_POST
-def generate_topology(request):
-    # TODO(ercanucan): This function should be refactored into smaller pieces.
-    topology_params = request.POST.copy()
-    topology_params.pop('csrfmiddlewaretoken',
-                        None)  # remove csrf entry, as we don't need it here
-
+def topology_from_params(tp):
+    """
+    Builds the topology dictionary of an AS from the topology form.
+    :param MultiValueDict tp: the submitted topology form.
+    :rtype: dict
+    """
     topo_dict = {}
-    tp = topology_params
-    isd_as = tp['inputISD_AS']
-    isd_id, as_id = isd_as.split('-')
     topo_dict['Core'] = True if (tp['inputIsCore'] == 'on') else False
 
     service_types = ['BeaconServer', 'CertificateServer',
@@ -971,6 +1032,24 @@ def generate_topology(request):
         int_key += 1
 
     topo_dict['Zookeepers'] = zk_dict
+    return topo_dict
+
+
+@require_POST
+def generate_topology(request):
+    """
+    Validates the topology form and queues the generation of the AS
+    configuration, see apply_topology(). AJAX requests get the id and the
+    status URL of the job, other requests are redirected back.
+    """
+    topology_params = request.POST.copy()
+    topology_params.pop('csrfmiddlewaretoken',
+                        None)  # remove csrf entry, as we don't need it here
+
+    tp = topology_params
+    isd_as = tp['inputISD_AS']
+    isd_id, as_id = isd_as.split('-')
+    topo_dict = topology_from_params(tp)
 
     # IP:port uniqueness in AS check
     all_ip_port_pairs = []
@@ -985,28 +1064,73 @@ def generate_topology(request):
         return JsonResponse(
             {'data': 'IP:port combinations not unique within AS'})
 
-    os.makedirs(static_tmp_path, exist_ok=True)
-    with open(yaml_topo_path, 'w') as file:
-        yaml.dump(topo_dict, file, default_flow_style=False)
-
-    create_local_gen(isd_as, topo_dict)
-    commit_hash = tp['commitHash']
-    # sanitize commit hash from comments, take first part up to |, strip spaces
-    commit_hash = (commit_hash.split('|'))[0].strip()
-    generate_ansible_hostfile(topology_params,
-                              topo_dict,
-                              isd_as,
-                              commit_hash)
-
-    curr_as = get_object_or_404(AD, as_id=as_id, isd=isd_id)
-    # load as usual model (for persistance and display in overview)
-    # TODO : hash displayed queryset and curr_as query set and compare
-    # allow the user to write back the new configuration only if it hasn't
-    # changed in the meantime
-    curr_as.fill_from_topology(topo_dict, clear=True)
+    get_object_or_404(AD.objects.light(), as_id=as_id, isd=isd_id)
+    # The form is passed on as is, the topology is rebuilt by the job (its
+    # Zookeeper keys would not survive the JSON serialization)
+    job = enqueue_job('ad_manager.views.apply_topology', request.user,
+                      topology_params=dict(topology_params.lists()))
+    return _job_queued_response(
+        request, job, 'The configuration of AS %s is being generated '
+                      '(job %s).' % (isd_as, job.id))
 
-    current_page = request.META.get('HTTP_REFERER')
-    return redirect(current_page)
+
+def apply_topology(topology_params):
+    """
+    Job generating the configuration of an AS from the topology form and
+    storing the topology in the database. Jobs of the same AS are
+    serialized by a file lock, the database is only written at the end.
+    :param dict topology_params: the values of the topology form keyed by
+    the field name.
+    """
+    tp = MultiValueDict(topology_params)
+    isd_as = tp['inputISD_AS']
+    isd_id, as_id = isd_as.split('-')
+    topo_dict = topology_from_params(tp)
+    with as_gen_lock(os.path.join(WEB_ROOT, 'gen'), ISD_AS(isd_as),
+                     purpose='apply'):
+        curr_as = get_object_or_404(AD, as_id=as_id, isd=isd_id)
+
+        os.makedirs(static_tmp_path, exist_ok=True)
+        with open(yaml_topo_path, 'w') as file:
+            dump_yaml(topo_dict, file)
+
+        commit_hash = tp['commitHash']
+        # sanitize commit hash from comments, take first part up to |,
+        # strip spaces
+        commit_hash = (commit_hash.split('|'))[0].strip()
+        # Published together with the other files of the AS
+        hostfile = render_ansible_hostfile(tp, topo_dict, isd_as, commit_hash)
+        create_local_gen(isd_as, topo_dict, hostfile=hostfile)
+
+        # load as usual model (for persistance and display in overview)
+        # TODO : hash displayed queryset and curr_as query set and compare
+        # allow the user to write back the new configuration only if it
+        # hasn't changed in the meantime
+        with transaction.atomic():
+            curr_as.fill_from_topology(topo_dict, clear=True, bulk=True)
+
+
+def _job_queued_response(request, job, message):
+    if request.is_ajax():
+        return JsonResponse({'job_id': job.id,
+                             'status_url': reverse('job_status',
+                                                   args=[job.id])})
+    messages.info(request, message)
+    return redirect(request.META.get('HTTP_REFERER'))
+
+
+def job_status(request, job_id):
+    """
+    Returns the status of a background job as JSON, for the UI to poll.
+    Jobs are only visible to the user who queued them and to staff users,
+    other users cannot tell whether a job exists.
+    """
+    job = get_object_or_404(Job, id=job_id)
+    if not request.user.is_staff and (
+            job.created_by_id is None or
+            job.created_by_id != request.user.id):
+        raise Http404('No such job')
+    return JsonResponse(job.as_dict())
 
 
 def get_own_local_ip():
@@ -1061,7 +1185,12 @@ def upload_file(request):
         if form.is_valid():
             if '_upload_topo' in request.POST:
                 path = handle_uploaded_file(request.FILES['file'])
-                create_global_gen(path)  # to get the trc file
+                # to get the trc file
+                job = enqueue_job('ad_manager.views.create_global_gen',
+                                  request.user, topo_path=path)
+                return _job_queued_response(
+                    request, job, 'The topology is being generated (job %s).'
+                                  % job.id)
             elif '_upload_init_topo' in request.POST:
                 path = []
                 for topo_file in request.FILES.getlist('file'):
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro benchmarks for scion-web. All data created by a benchmark is rolled
+back at the end.
+
+Usage: benchmark.py <name> [<size>]
+"""
+
+# Stdlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import dirname as d
+from shutil import rmtree
+
+sys.path.insert(0, d(d(os.path.abspath(__file__))))  # noqa
+sys.path.insert(0, d(d(d(d(os.path.abspath(__file__))))))  # noqa
+
+# Set up the Django environment
+os.environ['DJANGO_SETTINGS_MODULE'] = 'web_scion.settings.private'  # noqa
+
+# External packages
+import django
+django.setup()  # noqa
+import requests
+from django.db import transaction
+
+# SCION-WEB
+from ad_manager.models import AD, ISD
+from ad_manager.util.local_config_generator import create_local_gen
+from ad_manager.util.coord_client import CoordClient
+from ad_manager.util.defines import POLL_EVENTS_SVC
+from ad_manager.util.yaml_util import YAML_BACKENDS, dump_yaml, load_yaml
+from scripts.coord_stub import CoordStub
+
+
+class Rollback(Exception):
+    pass
+
+
+def _measure(func):
+    """
+    Runs func and returns (result, wall time in seconds, peak memory in KiB).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024
+
+
+def _loaded_bytes(ases):
+    """
+    Approximates the transferred row size by the size of the loaded values.
+    """
+    total = 0
+    for as_obj in ases:
+        for field in AD._meta.concrete_fields:
+            value = as_obj.__dict__.get(field.attname)
+            if value is not None:
+                total += len(str(value))
+    return total
+
+
+def bench_light_ads(size=5000):
+    """
+    Compares loading all ASes with and without deferring the heavy columns.
+    """
+    isd = ISD.objects.create(id=max(ISD.objects.values_list('id', flat=True)
+                                    or [0]) + 1)
+    topology = {'BorderRouters': {str(i): {'Addr': '127.0.0.%s' % i}
+                                  for i in range(1, 50)}}
+    AD.objects.bulk_create(
+        AD(isd=isd, as_id=i, original_topology=topology,
+           certificate='c' * 2000, trc='t' * 1500,
+           sig_pub_key='k' * 44, sig_priv_key='k' * 88,
+           enc_pub_key='k' * 44, enc_priv_key='k' * 44,
+           master_as_key='k' * 24)
+        for i in range(1, size + 1))
+    print('%s ASes' % AD.objects.count())
+    for name, queryset in [('all()', AD.objects.all),
+                           ('light()', AD.objects.light)]:
+        ases, elapsed, peak = _measure(lambda: list(queryset()))
+        print('%-8s %8.3fs %10.0f KiB peak %12d bytes loaded' % (
+            name, elapsed, peak, _loaded_bytes(ases)))
+
+
+def _synthetic_topology(isd_id, as_id, instance_count):
+    """
+    Builds a topology with instance_count instances spread over the border
+    routers and the four server types.
+    """
+    def addr(i):
+        return '127.%s.%s.%s' % (i // 62500 + 1, i // 250 % 250, i % 250 + 1)
+
+    keys = [('BorderRouters', 'br'), ('BeaconServers', 'bs'),
+            ('CertificateServers', 'cs'), ('PathServers', 'ps'),
+            ('SibraServers', 'sb')]
+    topo = {key: {} for key, _ in keys}
+    topo.update({'ISDID': isd_id, 'ADID': as_id, 'Core': 0, 'Zookeepers': {
+        '1': {'Addr': '127.0.0.1', 'Port': 2181, 'AddrInternal': '',
+              'PortInternal': None}}})
+    for i in range(instance_count):
+        key, prefix = keys[i % len(keys)]
+        name = '%s%s-%s-%s' % (prefix, isd_id, as_id, i + 1)
+        if key == 'BorderRouters':
+            topo[key][name] = {'Addr': addr(2 * i), 'Port': 31000,
+                               'Interface': {
+                                   'Addr': addr(2 * i + 1),
+                                   'ToAddr': '127.255.0.1',
+                                   'UdpPort': 50000, 'ToUdpPort': 50000,
+                                   'IFID': i + 1,
+                                   'ISD_AS': '%s-%s' % (isd_id, as_id + 1),
+                                   'LinkType': 'CHILD'}}
+        else:
+            topo[key][name] = {'Addr': addr(2 * i), 'Port': 31000,
+                               'AddrInternal': '', 'PortInternal': None}
+    return topo
+
+
+def bench_local_gen(size=500):
+    """
+    Compares writing the gen folder of an AS with 'size' instances serially
+    and with a growing number of writer threads.
+    """
+    isd = ISD.objects.create(id=max(ISD.objects.values_list('id', flat=True)
+                                    or [0]) + 1)
+    AD.objects.create(isd=isd, as_id=1, certificate='c' * 2000,
+                      trc='t' * 1500, sig_priv_key='k' * 88,
+                      enc_priv_key='k' * 44, master_as_key='k' * 24)
+    topo = _synthetic_topology(isd.id, 1, size)
+    gen_path = tempfile.mkdtemp()
+    try:
+        print('%s instances' % size)
+        for workers in (1, 2, 4, 8, 16):
+            _, elapsed, peak = _measure(lambda: create_local_gen(
+                '%s-1' % isd.id, topo, gen_path, workers))
+            print('%2d workers %8.3fs %10.0f KiB peak' % (
+                workers, elapsed, peak))
+    finally:
+        rmtree(gen_path, True)
+
+
+def bench_yaml(size=2000):
+    """
+    Compares dumping and loading a topology with 'size' instances with the
+    available YAML backends.
+    """
+    topo = _synthetic_topology(1, 1, size)
+    print('%s instances' % size)
+    for backend in YAML_BACKENDS:
+        text, dump_time, _ = _measure(lambda: dump_yaml(topo, backend=backend))
+        _, load_time, _ = _measure(lambda: load_yaml(text, backend=backend))
+        print('%-8s dump %8.3fs load %8.3fs %10d bytes' % (
+            backend, dump_time, load_time, len(text)))
+
+
+def bench_coord(size=500):
+    """
+    Compares 'size' event polls against the local coordination stub with a
+    new connection per request and with the pooled client.
+    """
+    stub = CoordStub().start()
+    url = stub.uri + POLL_EVENTS_SVC + 'account/secret'
+    client = CoordClient()
+    try:
+        print('%s requests' % size)
+        for name, post in [
+                ('requests.post', lambda: requests.post(
+                    url, json={'IsdAs': '1-1'})),
+                ('CoordClient', lambda: client.post(url, {'IsdAs': '1-1'}))]:
+            connections = stub.connections
+            _, elapsed, _ = _measure(lambda: [post() for _ in range(size)])
+            print('%-14s %8.3fs %6d connections' % (
+                name, elapsed, stub.connections - connections))
+    finally:
+        client.close()
+        stub.stop()
+
+
+BENCHMARKS = {
+    'coord': bench_coord,
+    'light_ads': bench_light_ads,
+    'local_gen': bench_local_gen,
+    'yaml': bench_yaml,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__.strip())
+        print('Benchmarks: %s' % ', '.join(sorted(BENCHMARKS)))
+        sys.exit(1)
+    args = [int(arg) for arg in sys.argv[2:]]
+    try:
+        with transaction.atomic():
+            BENCHMARKS[sys.argv[1]](*args)
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# Copyright 2017 ETH Zurich
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local stand-in for the SCION Coordination Service, for tests and benchmarks.
+Uploads are accepted and recorded, polls are answered from the replies and
+events registered on the stub.
+
+Usage: coord_stub.py [<port>]
+"""
+
+# Stdlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import dirname as d
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, d(d(os.path.abspath(__file__))))  # noqa
+
+# SCION-WEB
+from ad_manager.util.defines import (
+    POLL_EVENTS_SVC,
+    POLL_JOIN_REPLY_SVC,
+)
+
+
+class CoordStub(object):
+    """
+    :ivar dict join_replies: join reply by join request id.
+    :ivar set failing_join_requests: ids of the join requests whose polls are
+    answered with 500 (or which are left out of batched polls).
+    :ivar bool batch_polls: whether batched join reply polls are supported.
+    :ivar tuple batch_reply: (status, content) answering batched join reply
+    polls instead, if set.
+    :ivar dict events: pollEvents reply by ISD-AS.
+    :ivar list received: (path, content) of every handled request.
+    :ivar int connections: the number of accepted connections.
+    :ivar int fail_next: the number of following requests answered with 503.
+    :ivar float delay: seconds to wait before answering a request.
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.join_replies = {}
+        self.failing_join_requests = set()
+        self.batch_polls = True
+        self.batch_reply = None
+        self.events = {}
+        self.received = []
+        self.connections = 0
+        self.fail_next = 0
+        self.delay = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def uri(self):
+        return 'http://%s:%s' % self._server.server_address[:2]
+
+    def start(self):
+        """
+        Serves requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def handle(self, path, content):
+        """
+        Answers a request.
+        :returns: the status code and the content of the reply.
+        :rtype: (int, dict)
+        """
+        with self._lock:
+            self.received.append((path, content))
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, {}
+        if self.delay:
+            time.sleep(self.delay)
+        if path.startswith(POLL_JOIN_REPLY_SVC):
+            if 'request_ids' in content:
+                return self._batched_join_replies(content['request_ids'])
+            if 'request_id' not in content:
+                return 400, {}
+            if content['request_id'] in self.failing_join_requests:
+                return 500, {}
+            return 200, self.join_replies.get(content['request_id'], {})
+        if path.startswith(POLL_EVENTS_SVC):
+            return 200, self.events.get(content['IsdAs'], {
+                'JoinRequests': [], 'ConnRequests': [], 'ConnReplies': []})
+        return 200, {}
+
+    def _batched_join_replies(self, jr_ids):
+        if not self.batch_polls:
+            return 400, {}
+        if self.batch_reply is not None:
+            return self.batch_reply
+        return 200, {'JoinReplies': {
+            str(jr_id): self.join_replies.get(jr_id, {}) for jr_id in jr_ids
+            if jr_id not in self.failing_join_requests}}
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections alive
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.stub.connected()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        content = json.loads(self.rfile.read(length).decode() or '{}')
+        status, reply = self.server.stub.handle(self.path, content)
+        body = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    stub = CoordStub(port=port)
+    print('Serving on %s' % stub.uri)
+    stub.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
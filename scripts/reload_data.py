@@ -41,6 +41,11 @@ from lib.topology import Topology
 
 # Django app imports
 from ad_manager.models import AD, ISD
+from ad_manager.util.address_pool import seed_address_pool
+from ad_manager.util.local_config_generator import (
+    remove_deleted_prometheus_targets,
+)
+from ad_manager.util.yaml_util import load_yaml
 from django.contrib.auth.models import User
 
 WEB_SCION_DIR = os.path.join(PROJECT_ROOT, 'web_scion')
@@ -83,7 +88,7 @@ def get_topology(file):
     """
     with open(file, 'r') as stream:
         try:
-            topo_dict = yaml.load(stream)
+            topo_dict = load_yaml(stream)
             return topo_dict
         except (yaml.YAMLError, KeyError):
             return []  # TODO: give user feedback
@@ -156,12 +161,15 @@ def reload_data_from_files(topology_files, on_the_fly_refs=False):
         topo_dict = as_topo_dicts[ad.id]
         ad.fill_from_topology(topo_dict, auto_refs=on_the_fly_refs)
         print('> AS {} is loaded'.format(ad))
+    # Imported addresses must never be handed out for new routers
+    seed_address_pool()
     transaction.commit()
     transaction.set_autocommit(True)
 
 
 def reload_data():
     transaction.set_autocommit(True)
+    previous = set(AD.objects.values_list('isd_id', 'as_id'))
     clear_everything()
     add_users()
 
@@ -172,6 +180,8 @@ def reload_data():
     topology_files = glob.glob(yaml_path)
 
     reload_data_from_files(topology_files)
+    remove_deleted_prometheus_targets(
+        previous - set(AD.objects.values_list('isd_id', 'as_id')))
 
 
 if __name__ == "__main__":
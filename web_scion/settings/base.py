@@ -123,6 +123,34 @@ TWO_FACTOR_PATCH_ADMIN = ENABLED_2FA
 # Security settings
 CSRF_COOKIE_HTTPONLY = True
 
+# Number of threads writing the gen folder of an AS, see create_local_gen()
+GEN_WRITER_WORKERS = 8
+# Hard-link static files (e.g. the path policy) into the gen folder instead
+# of copying them
+GEN_LINK_STATIC_FILES = False
+
+# Number of worker processes started by `manage.py run_jobs`
+JOB_WORKERS = 2
+# Seconds an idle job worker waits before it looks for new jobs
+JOB_POLL_INTERVAL = 1.0
+# Seconds after which a running job is considered abandoned by its worker
+# and requeued, must exceed the duration of the longest job
+JOB_TIMEOUT = 3600
+
+# SCION Coordination Service client, see ad_manager.util.coord_client
+# Maximum number of pooled connections
+COORD_POOL_SIZE = 10
+# Connect and read timeouts in seconds
+COORD_CONNECT_TIMEOUT = 3.05
+COORD_READ_TIMEOUT = 10
+# Retries of idempotent requests (polls) and the delay before the first one
+COORD_RETRIES = 3
+COORD_RETRY_BACKOFF = 0.5
+# Maximum number of concurrent join reply polls
+COORD_POLL_WORKERS = 8
+# Seconds between two polls of the AS events by `manage.py poll_coord_events`
+COORD_EVENTS_POLL_INTERVAL = 60
+
 # configure logging
 LOGGING = {
     'version': 1,